@@ -0,0 +1,3 @@
+"""
+Benchmarks of the pipeline stages on synthetic data.
+"""
@@ -0,0 +1,100 @@
+"""
+Measure peak memory (resident set size) of a full run of program.py on
+synthetic data, each run in a fresh interpreter. Needs a Unix system.
+
+Run from the students_analysis directory:
+
+    python -m benchmarks.memory --scale 1 --repeat 3
+
+To compare with another version of the program, for example a checkout of an
+earlier commit, pass --program path/to/that/program.py; the same data is used.
+To compare options of the program, for example the out-of-core mode, pass them
+as a single argument: --options='--out-of-core 16'.
+"""
+
+import argparse
+import json
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+from benchmarks import synthetic
+
+# Run in a fresh interpreter: runs the command given as arguments and prints
+# the peak memory of its processes, in kilobytes (bytes on macOS)
+MEASURE = ('import resource, subprocess, sys; '
+           'subprocess.run(sys.argv[1:], check=True, stdout=subprocess.DEVNULL); '
+           'print(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)')
+
+
+def peak_rss(command: list, cwd: str) -> int:
+    """
+    :param command: command to run
+    :param cwd: directory to run it in
+    :return: peak resident set size of the command, in bytes
+    """
+    result = subprocess.run([sys.executable, '-c', MEASURE] + command, cwd=cwd, check=True,
+                            capture_output=True, text=True)
+    peak = int(result.stdout.strip())
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def benchmark(scale: float, programs: list, repeat: int, fmt: str, options: str = '') -> list:
+    """
+    Generate data of the given size and measure peak memory of each program on it.
+
+    :param scale: size relative to the national data
+    :param programs: paths to program.py of each version to compare
+    :param repeat: how many times to run each program; the lowest peak counts
+    :param fmt: format of the results
+    :param options: further options of the programs
+    :return: list of results for each program
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        schools = synthetic.generate_schools(scale)
+        schools_path = os.path.join(tmp_dir, 'schools.xlsx')
+        synthetic.write_schools(schools, schools_path)
+        synthetic.write_population(synthetic.generate_population(schools), tmp_dir)
+        outpaths = [os.path.join(tmp_dir, f'{name}.{fmt}')
+                    for name in ['gmina_per_teacher', 'gminatype_per_teacher',
+                                 'gminatype_per_age']]
+
+        for program in programs:
+            program = os.path.abspath(program)
+            command = [sys.executable, program, schools_path, tmp_dir, *outpaths, '--no-cache',
+                       *shlex.split(options)]
+            peak = min(peak_rss(command, os.path.dirname(program)) for _ in range(repeat))
+            results.append({'program': program, 'options': options, 'scale': scale,
+                            'schools': len(schools),
+                            'peak_rss_mb': round(peak / 2 ** 20, 1)})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure peak memory of a full run of the '
+                                                 'program on synthetic data.')
+    parser.add_argument('--scale', type=float, default=1,
+                        help='size of data, relative to the national data')
+    parser.add_argument('--program', type=str, nargs='+', default=['program.py'],
+                        help='program.py of each version to compare')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each program')
+    parser.add_argument('--format', type=str, default='xlsx', help='format of the results')
+    parser.add_argument('--options', type=str, default='',
+                        help='further options of the programs, as a single argument')
+    parser.add_argument('--output', type=str, help='save the results as JSON to this file')
+    args = parser.parse_args()
+
+    results = benchmark(args.scale, args.program, args.repeat, args.format, args.options)
+    for result in results:
+        print(f'{result["program"]}: {result["peak_rss_mb"]:.1f} MB peak for '
+              f'{result["schools"]} schools')
+
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
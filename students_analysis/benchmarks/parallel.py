@@ -0,0 +1,99 @@
+"""
+Measure speedup of per teacher statistics of gminas calculated by several
+worker processes, on synthetic data, and check that the results are the same
+as calculated by one process.
+
+Run from the students_analysis directory:
+
+    python -m benchmarks.parallel --scale 10 --workers 1 2 4 8
+
+Speedup is bounded by the number of CPUs (printed with the results).
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import time
+import pandas as pd
+from benchmarks import synthetic
+from src import parallel, per_teacher_analysis
+from src.schools_pkg import calculate, parsing, schema
+from src.schools_pkg.save import GMINA_COLS
+
+
+def prepare_schools(scale: float) -> pd.DataFrame:
+    """
+    :param scale: size relative to the national data
+    :return: synthetic data about schools, prepared as for per teacher statistics
+    """
+    schools = synthetic.generate_schools(scale)
+    # Diagnostics of cleaning the data are not of interest here
+    with contextlib.redirect_stdout(io.StringIO()):
+        schools = parsing.drop_delegatures(parsing.set_regon_as_index(
+            schema.apply_schema(schools.set_index('Lp.')).reset_index()))
+        return per_teacher_analysis.students_per_teacher(schools)[0]
+
+
+def benchmark(scale: float, workers: list, repeat: int, backend: str,
+              relative_accuracy: float = None) -> list:
+    """
+    :param scale: size relative to the national data
+    :param workers: numbers of workers to compare
+    :param repeat: how many times to run each calculation; the fastest run counts
+    :param backend: 'multiprocessing' or 'dask'
+    :param relative_accuracy: None for exact medians, or relative error of
+        approximate medians
+    :return: list of results for each number of workers
+    """
+    schools = prepare_schools(scale)
+    results = []
+    serial = None
+    for count in workers:
+        seconds = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            stats = calculate.group_schools_with_statistics(schools, GMINA_COLS,
+                                                            relative_accuracy, count, backend)
+            seconds.append(time.perf_counter() - start)
+        if serial is None:
+            serial = stats
+        results.append({'workers': count, 'backend': backend, 'scale': scale,
+                        'schools': len(schools), 'seconds': round(min(seconds), 4),
+                        'identical': stats.equals(serial)})
+
+    for result in results:
+        result['speedup'] = round(results[0]['seconds'] / result['seconds'], 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure speedup of per teacher statistics of '
+                                                 'gminas with the number of workers.')
+    parser.add_argument('--scale', type=float, default=10,
+                        help='size of data, relative to the national data')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4],
+                        help='numbers of workers to compare, the first one is the reference')
+    parser.add_argument('--repeat', type=int, default=3, help='runs for each number of workers')
+    parser.add_argument('--backend', type=str, default=parallel.DEFAULT_BACKEND,
+                        choices=parallel.available_backends(), help='what runs the workers')
+    parser.add_argument('--approximate-medians', type=float, metavar='ERROR',
+                        help='read medians from quantile sketches with this relative error')
+    parser.add_argument('--output', type=str, help='save the results as JSON to this file')
+    args = parser.parse_args()
+
+    results = benchmark(args.scale, args.workers, args.repeat, args.backend,
+                        args.approximate_medians)
+    print(f'{results[0]["schools"]} schools, {os.cpu_count()} CPUs, {args.backend} backend')
+    for result in results:
+        print(f'  {result["workers"]:>3} workers: {result["seconds"]:>8.3f} s, speedup '
+              f'{result["speedup"]:.2f}, same results: {result["identical"]}')
+
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
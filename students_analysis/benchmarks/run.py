@@ -0,0 +1,120 @@
+"""
+Time each stage of the pipeline on synthetic data of growing size.
+
+Run from the students_analysis directory:
+
+    python -m benchmarks.run --scales 1 2 5 10 50 --output bench.json
+
+Loading of the Excel files is timed only up to --max-excel-scale, since
+larger workbooks take long to write and do not fit in a single sheet.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+from benchmarks import synthetic
+from src import profiling
+from src import schools_for_ages as sfa
+from src.population_pkg import calculate as pop_calculate
+from src.population_pkg import parsing as pop_parsing
+from src.schools_pkg import calculate as sc_calculate
+from src.schools_pkg import parsing as sc_parsing
+from src.schools_pkg import schema
+from src.schools_pkg.save import GMINA_COLS, GMINATYPE_COLS
+
+
+def run_stages(schools, population, workers: int = 1):
+    """
+    Run all the stages of the pipeline on loaded data, as in program.py, but
+    without saving the results.
+
+    :param schools: dataframe as returned by schools_pkg.parsing.load_schools_df
+    :param population: dataframe as returned by population_pkg.parsing.load_population
+    :param workers: number of processes for per age calculations
+    """
+    stage = profiling.stage
+    schools = stage('drop duplicate regon', sc_parsing.set_regon_as_index, schools)
+    schools = stage('drop delegatures', sc_parsing.drop_delegatures, schools)
+    schools = stage('sum teachers', sc_parsing.sum_teachers, schools)
+    stage('reallocate teachers', sc_parsing.reallocate_teachers_per_regon, schools)
+    schools = stage('drop schools without students', sc_parsing.drop_schools_without_students,
+                    schools)
+    stage('students per teacher', sc_parsing.students_per_teachers_in_school, schools)
+    stage('gmina statistics', sc_calculate.group_schools_with_statistics, schools, GMINA_COLS)
+    stage('gminatype statistics', sc_calculate.group_schools_with_statistics, schools,
+          GMINATYPE_COLS)
+
+    schools, _ = stage('normalize schools', sfa.normalize_schools, schools)
+    schools = stage('trim schools', sfa.trim_schools_for_population, schools)
+    schools = stage('reallocate preschool', sfa.reallocate_preschool, schools)
+    stage('students per age', pop_calculate.students_per_age_from_population, schools,
+          population, workers)
+
+
+def benchmark(scale: float, with_excel: bool, workers: int = 1) -> dict:
+    """
+    Generate data of the given size and time all the stages on it.
+
+    :param scale: size relative to the national data
+    :param with_excel: whether to also write the Excel files and time loading them
+    :param workers: number of processes for per age calculations
+    :return: profiling report, with the scale and the number of schools
+    """
+    schools = synthetic.generate_schools(scale)
+    sheets = synthetic.generate_population(schools)
+    profiling.enable()
+
+    if with_excel:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            schools_path = os.path.join(tmp_dir, 'schools.xlsx')
+            synthetic.write_schools(schools, schools_path)
+            synthetic.write_population(sheets, tmp_dir)
+            schools = profiling.stage('load schools', sc_parsing.load_schools_df, schools_path)
+            population = profiling.stage('load population', pop_parsing.load_population, tmp_dir)
+    else:
+        schools = schema.apply_schema(schools.set_index('Lp.'))
+        # Skip the headers, as read_excel does
+        population = pop_parsing.parse_population_sheets(
+            {sheetname: sheet.iloc[8:].reset_index(drop=True) for sheetname, sheet in sheets.items()})
+
+    run_stages(schools, population, workers)
+    report = profiling.report()
+    profiling.disable()
+
+    report.update({'scale': scale, 'schools': len(schools)})
+    for entry in report['stages']:
+        entry['rows_per_second'] = round(entry['rows_in'] / entry['seconds']) \
+            if entry['rows_in'] and entry['seconds'] else None
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark pipeline stages on synthetic data.')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 2, 5],
+                        help='sizes of data, relative to the national data')
+    parser.add_argument('--max-excel-scale', type=float, default=1,
+                        help='largest scale for which loading of Excel files is timed')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes for per age calculations')
+    parser.add_argument('--output', type=str, help='where to save all the reports as JSON')
+    args = parser.parse_args()
+
+    reports = []
+    for scale in args.scales:
+        report = benchmark(scale, scale <= args.max_excel_scale, args.workers)
+        reports.append(report)
+
+        print(f'\nScale {scale:g}: {report["schools"]} schools, '
+              f'{report["total_seconds"]:.2f} s in total')
+        for entry in report['stages']:
+            print(f'  {entry["stage"]:<25} {entry["seconds"]:>9.3f} s  '
+                  f'{entry["rows_in"] or "":>8} -> {entry["rows_out"] or "":<8}')
+
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(reports, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
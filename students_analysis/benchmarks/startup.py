@@ -0,0 +1,78 @@
+"""
+Measure how long it takes to start the program and import parts of the
+package, each in a fresh interpreter, and whether pandas gets imported.
+
+Run from the students_analysis directory:
+
+    python -m benchmarks.startup --repeat 5
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+# Statement run in a fresh interpreter -> name in the report
+CASES = {'import src': 'import src',
+         'from src.population_pkg.ages import agerange_for_school':
+             'agerange_for_school',
+         'from src import cli; cli.build_parser()': 'argument parser',
+         'import src.per_age_analysis, src.per_teacher_analysis': 'whole pipeline'}
+CHECK_PANDAS = "; import sys; print('pandas' in sys.modules)"
+
+
+def time_command(command: list, repeat: int) -> float:
+    """
+    :param command: command to run
+    :param repeat: how many times to run it
+    :return: shortest wall time of the command, in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def benchmark(repeat: int) -> list:
+    """
+    Time the interpreter alone, program.py --help and each of the CASES.
+
+    :param repeat: how many times to run each command; the shortest time counts
+    :return: list of results for each command
+    """
+    results = [{'name': 'interpreter alone', 'seconds': time_command([sys.executable, '-c', 'pass'],
+                                                                     repeat),
+                'imports_pandas': False},
+               {'name': 'program.py --help',
+                'seconds': time_command([sys.executable, 'program.py', '--help'], repeat),
+                'imports_pandas': None}]
+    for statement, name in CASES.items():
+        imports_pandas = subprocess.run([sys.executable, '-c', statement + CHECK_PANDAS],
+                                        check=True, capture_output=True, text=True).stdout
+        results.append({'name': name,
+                        'seconds': time_command([sys.executable, '-c', statement], repeat),
+                        'imports_pandas': imports_pandas.strip() == 'True'})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure startup and import time of the package.')
+    parser.add_argument('--repeat', type=int, default=5, help='runs of each command')
+    parser.add_argument('--output', type=str, help='save the results as JSON to this file')
+    args = parser.parse_args()
+
+    results = benchmark(args.repeat)
+    for result in results:
+        pandas_note = 'imports pandas' if result['imports_pandas'] else ''
+        print(f'{result["name"]:<20} {result["seconds"] * 1000:8.1f} ms  {pandas_note}')
+
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
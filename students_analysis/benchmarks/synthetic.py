@@ -0,0 +1,182 @@
+"""
+Generate synthetic data about schools and population, with the same columns
+and quirks as the official files, in any size.
+
+Scale 1 corresponds to the national data: about 2,500 gminas and 30,000
+schools. The population workbook is written in .xlsx format under the name
+tabela12.xls, which pandas reads the same way, since it detects the format
+from the content.
+"""
+
+import math
+import os.path
+import numpy as np
+import pandas as pd
+
+VOIVODESHIPS = ['DOLNOŚLĄSKIE', 'KUJAWSKO-POMORSKIE', 'LUBELSKIE', 'LUBUSKIE', 'ŁÓDZKIE',
+                'MAŁOPOLSKIE', 'MAZOWIECKIE', 'OPOLSKIE', 'PODKARPACKIE', 'PODLASKIE',
+                'POMORSKIE', 'ŚLĄSKIE', 'ŚWIĘTOKRZYSKIE', 'WARMIŃSKO-MAZURSKIE', 'WIELKOPOLSKIE',
+                'ZACHODNIOPOMORSKIE']
+
+# Types of school with their share among schools; the last ones have unclear age range
+SCHOOL_TYPES = {'Przedszkole': 0.25, 'Punkt przedszkolny': 0.05,
+                'Zespół wychowania przedszkolnego': 0.01, 'Szkoła podstawowa': 0.3,
+                'Ogólnokształcąca szkoła muzyczna I stopnia': 0.01, 'Gimnazjum': 0.05,
+                'Branżowa szkoła I stopnia': 0.04, 'Liceum ogólnokształcące': 0.07,
+                'Technikum': 0.06, 'Czteroletnie liceum plastyczne': 0.005,
+                'Szkoła specjalna przysposabiająca do pracy': 0.01, 'Szkoła policealna': 0.08,
+                'Poradnia psychologiczno-pedagogiczna': 0.065}
+
+GMINA_TYPES = {'M': 1, 'Gm': 2, 'M-Gm': 3}
+
+NATIONAL_GMINAS = 2500
+NATIONAL_SCHOOLS = 30000
+MAX_AGE = 30
+
+
+def gmina_layout(scale: float) -> (int, int):
+    """
+    Choose the number of powiats in each voivodeship and gminas in each powiat,
+    so that codes still have two digits each.
+
+    :param scale: size relative to the national data
+    :return:
+        - number of powiats in each voivodeship
+        - number of gminas in each powiat
+    """
+    gminas = NATIONAL_GMINAS * scale / len(VOIVODESHIPS)
+    powiats = min(99, max(1, math.ceil(24 * math.sqrt(scale))))
+    return powiats, min(99, max(1, math.ceil(gminas / powiats)))
+
+
+def generate_gminas(scale: float, seed: int = 0) -> pd.DataFrame:
+    """
+    Generate all the gminas, one row each.
+
+    :param scale: size relative to the national data
+    :param seed: seed of the random generator
+    :return: dataframe with codes, names and types of gminas
+    """
+    rng = np.random.default_rng(seed)
+    powiats, gminas = gmina_layout(scale)
+
+    woj = np.repeat(np.arange(2, 2 * len(VOIVODESHIPS) + 1, 2), powiats * gminas)
+    pow_ = np.tile(np.repeat(np.arange(1, powiats + 1), gminas), len(VOIVODESHIPS))
+    gm = np.tile(np.arange(1, gminas + 1), len(VOIVODESHIPS) * powiats)
+    types = rng.choice(list(GMINA_TYPES), size=len(woj), p=[0.1, 0.6, 0.3])
+
+    return pd.DataFrame({'woj': woj, 'pow': pow_, 'gm': gm,
+                         'Województwo': [f'WOJ. {VOIVODESHIPS[w // 2 - 1]}' for w in woj],
+                         'Powiat': [f'Powiat {w}-{p}' for w, p in zip(woj, pow_)],
+                         'Gmina': [f'Gmina {w}-{p}-{g}' for w, p, g in zip(woj, pow_, gm)],
+                         'Typ gminy': types})
+
+
+def generate_schools(scale: float, seed: int = 0) -> pd.DataFrame:
+    """
+    Generate data about schools, with the columns of the official file.
+
+    Around 1% of schools share REGON with another one, 2% are delegatures
+    and every fifth school belongs to a facility with other schools.
+
+    :param scale: size relative to the national data
+    :param seed: seed of the random generator
+    :return: dataframe, as loaded by schools_pkg.parsing.load_schools_df, but
+        with 'Lp.' as a column
+    """
+    rng = np.random.default_rng(seed)
+    gminas = generate_gminas(scale, seed)
+    n = int(NATIONAL_SCHOOLS * scale)
+
+    schools = gminas.iloc[np.sort(rng.integers(0, len(gminas), n))].reset_index(drop=True)
+    schools.insert(0, 'Lp.', np.arange(1, n + 1))
+    schools.insert(8, 'Miejscowość', schools['Gmina'].str.replace('Gmina', 'Miasto'))
+    schools['Nazwa typu'] = rng.choice(list(SCHOOL_TYPES), size=n,
+                                       p=np.array(list(SCHOOL_TYPES.values())) /
+                                       sum(SCHOOL_TYPES.values()))
+    schools['Złożoność'] = rng.choice([1, 2, 3, 4], size=n, p=[0.7, 0.2, 0.08, 0.02])
+    schools['Nazwa szkoły, placówki'] = [f'Szkoła nr {i}' for i in range(n)]
+
+    regons = rng.choice(10 ** 13, size=n, replace=False) + 10 ** 13
+    duplicates = rng.random(n) < 0.01
+    regons[duplicates] = regons[rng.integers(0, n, duplicates.sum())]
+    schools['Regon'] = regons
+
+    students = rng.integers(0, 600, n) * (rng.random(n) > 0.05)
+    schools['Uczniowie, wychow., słuchacze'] = students
+    schools['w tym dziewczęta'] = (students * rng.uniform(0.4, 0.6, n)).astype(int)
+    primary = (schools['Nazwa typu'] == 'Szkoła podstawowa').to_numpy()
+    preschool = (students * rng.uniform(0, 0.2, n)).astype(int) * (rng.random(n) < 0.3) * primary
+    schools['w tym w oddziałach przedszk.'] = preschool
+    schools['w tym w oddziałach innego typu'] = 0
+    schools['Oddziały'] = (students / rng.uniform(15, 30, n)).astype(int)
+    schools['Nauczyciele pełnozatrudnieni'] = (students / rng.uniform(8, 20, n)).astype(int)
+    schools['Nauczyciele niepełnozatrudnieni (w etatach)'] = np.round(rng.uniform(0, 5, n), 2)
+
+    # Every fifth school is a part of bigger facility, with one of 3 REGONs
+    parents = np.where(rng.random(n) < 0.2, regons[np.arange(n) // 3 * 3], regons)
+    schools['Regon jednostki sprawozdawczej'] = parents
+
+    return schools
+
+
+def generate_population(schools: pd.DataFrame, seed: int = 0) -> dict:
+    """
+    Generate data about population for gminas from the schools data, with the
+    layout of the sheets in tabela12.xls: 8 rows of headers, then for each
+    gmina a row with its name and code followed by rows for each age with
+    blank code. Codes beginning with 0 are strings, others are numbers. Urban
+    and rural parts of M-Gm gminas are included as well, and around 1% of
+    gminas are missing.
+
+    :param schools: dataframe from generate_schools
+    :param seed: seed of the random generator
+    :return: dict of sheet (voivodeship name) -> dataframe with 3 columns
+    """
+    rng = np.random.default_rng(seed)
+    gminas = schools.drop_duplicates(['woj', 'pow', 'gm'])
+    ages = [str(age).ljust(2).rjust(9) for age in range(MAX_AGE + 1)]
+    sheets = {}
+
+    for woj, voivodeship in gminas.groupby('woj'):
+        rows = [[f'Nagłówek {i}', None, None] for i in range(8)]
+        for pow_, gm, gmina_type in zip(voivodeship['pow'], voivodeship['gm'],
+                                        voivodeship['Typ gminy'].map(GMINA_TYPES)):
+            if rng.random() < 0.01:
+                continue
+            parts = [gmina_type, 4, 5] if gmina_type == 3 else [gmina_type]
+            for part in parts:
+                code = f'{woj:02d}{pow_:02d}{gm:02d}{part}'
+                people = rng.integers(20, 400, len(ages))
+                rows.append([f'Gmina {code}', code if code[0] == '0' else int(code), people.sum()])
+                rows.extend([age, '       ', count] for age, count in zip(ages, people))
+
+        sheetname = voivodeship['Województwo'].iloc[0][5:].capitalize()
+        # Incorrect sheetname, as in the official file
+        sheets['Śląske' if sheetname == 'Śląskie' else sheetname] = pd.DataFrame(rows)
+
+    return sheets
+
+
+def write_schools(schools: pd.DataFrame, outfile: str):
+    """
+    Save data about schools like the official file, with empty row no. 1.
+
+    :param schools: dataframe from generate_schools
+    :param outfile: where to save the .xlsx file
+    """
+    empty = pd.DataFrame([[''] * len(schools.columns)], columns=schools.columns)
+    pd.concat([empty, schools]).to_excel(outfile, index=False)
+
+
+def write_population(sheets: dict, population_path: str):
+    """
+    Save data about population like the official tabela12.xls.
+
+    :param sheets: dict from generate_population
+    :param population_path: directory to save the file to
+    """
+    with pd.ExcelWriter(os.path.join(population_path, 'tabela12.xls'),
+                        engine='openpyxl') as writer:
+        for sheetname, sheet in sheets.items():
+            sheet.to_excel(writer, sheet_name=sheetname, header=False, index=False)
@@ -2,32 +2,88 @@
 Main program. Run to get the results.
 """
 
-import argparse
-from src import per_teacher_analysis, per_age_analysis
-
-
-parser = argparse.ArgumentParser(description='')
-parser.add_argument('schools_path', nargs='?', type=str, help='path to .xlsx file with schools data',
-                    default='data\\Wykaz_szkół_i_placówek_wg_stanu_na_30.IX._2018_w.5.xlsx')
-parser.add_argument('population_path', nargs='?', type=str, help='path to directory with population data',
-                    default='data\\Ludność. Stan i struktura_30.06.2020')
-parser.add_argument('outpath_gmina', nargs='?', type=str, help='where to save results of per teacher '
-                                                    'analysis, for each gmina',
-                    default='results\\gmina_per_teacher.xlsx')
-parser.add_argument('outpath_gminatype', nargs='?', type=str, help='where to save results of per teacher '
-                                                        'analysis, in total',
-                    default='results\\gminatype_per_teacher.xlsx')
-parser.add_argument('outpath_per_age', nargs='?', type=str, help='where to save results of per age '
-                                                      'analysis, in total',
-                    default='results\\gminatype_per_age.xlsx')
-args = parser.parse_args()
-
-
-schools, dropped_1 = per_teacher_analysis.run(args.schools_path, args.outpath_gmina,
-                                              args.outpath_gminatype)
-dropped_2 = per_age_analysis.run(schools, args.population_path, args.outpath_per_age)
-dropped_percentage = (dropped_1 + dropped_2) / (schools["Uczniowie, wychow., słuchacze"].sum()
-                                                + dropped_1) * 100
-
-print(f'{round(dropped_percentage, 2)}% of information about students dropped during all '
-      f'calculations.')
+from src import cli
+
+
+def enable_copy_on_write():
+    """
+    Let pandas share data between dataframes until one of them is modified.
+    The stages never write into dataframes they do not own, so the results are
+    the same; older versions of pandas without this mode copy eagerly instead.
+    """
+    import pandas as pd
+    try:
+        pd.set_option('mode.copy_on_write', True)
+    except (KeyError, AttributeError):
+        pass
+
+
+def main():
+    parser = cli.build_parser()
+    args = parser.parse_args()
+    # Imported here, so that --help does not wait for pandas
+    from src import (batch, out_of_core, output, parallel, per_teacher_analysis, per_age_analysis,
+                     profiling)
+    enable_copy_on_write()
+
+    cache_dir = None if args.no_cache else args.cache_dir
+    if args.approximate_medians is not None and not 0 < args.approximate_medians < 1:
+        parser.error('Relative error of approximate medians must be between 0 and 1.')
+    if args.out_of_core is not None and args.out_of_core < 1:
+        parser.error('Number of partitions must be positive.')
+    if args.parallel_backend not in parallel.available_backends():
+        parser.error(f'Backend {args.parallel_backend} is not installed.')
+    if args.profile is not None:
+        profiling.enable(use_cprofile=args.cprofile is not None,
+                         trace_memory=args.profile_memory)
+
+    if args.serve is not None:
+        from src import service
+        index = service.load_index(args.schools_path, args.population_path, cache_dir,
+                                   args.workers, relative_accuracy=args.approximate_medians)
+        service.serve(index, args.serve)
+    elif args.batch is not None:
+        # Only mistakes in the manifest are errors of usage, not errors of the runs
+        try:
+            manifest = batch.load_manifest(args.batch)
+        except (OSError, ValueError) as error:
+            parser.error(str(error))
+        batch.run_batch(manifest, cache_dir, args.workers, args.approximate_medians)
+    else:
+        try:
+            formats = output.parse_formats(args.format, ['gmina', 'gminatype', 'per_age'])
+            outpath_gmina = output.with_format(args.outpath_gmina, formats['gmina'])
+            outpath_gminatype = output.with_format(args.outpath_gminatype, formats['gminatype'])
+            outpath_per_age = output.with_format(args.outpath_per_age, formats['per_age'])
+            # Unknown extensions are found before anything is calculated
+            for outpath in [outpath_gmina, outpath_gminatype, outpath_per_age]:
+                output.infer_format(outpath)
+        except ValueError as error:
+            parser.error(str(error))
+
+        if args.out_of_core is not None:
+            students, dropped_1, dropped_2 = out_of_core.run(
+                args.schools_path, args.population_path, outpath_gmina, outpath_gminatype,
+                outpath_per_age, cache_dir, args.workers, args.out_of_core,
+                args.approximate_medians)
+        else:
+            schools, dropped_1 = per_teacher_analysis.run(args.schools_path, outpath_gmina,
+                                                          outpath_gminatype, cache_dir,
+                                                          args.approximate_medians, args.workers,
+                                                          args.parallel_backend)
+            dropped_2 = per_age_analysis.run(schools, args.population_path, outpath_per_age,
+                                             cache_dir, args.workers,
+                                             relative_accuracy=args.approximate_medians)
+            students = schools["Uczniowie, wychow., słuchacze"].sum()
+        dropped_percentage = (dropped_1 + dropped_2) / (students + dropped_1) * 100
+
+        print(f'{round(dropped_percentage, 2)}% of information about students dropped during '
+              f'all calculations.')
+
+    if args.profile is not None:
+        profiling.save_report(args.profile, args.cprofile)
+
+
+# Guard needed for the process pool, which may import this module again
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,23 @@
 """
 Calculate per teacher and per age statistics for students in gminas from
 official data.
+
+Submodules are imported on first access, so that importing the package (or
+a module which does not need pandas, like src.cli) is fast.
 """
 
-import pandas as pd
-import src.per_age_analysis
-import src.per_teacher_analysis
-import src.schools_for_ages
-import src.population_pkg
-import src.schools_pkg
+import importlib
+
+SUBMODULES = ('batch', 'cache', 'cli', 'gmina_codes', 'out_of_core', 'output', 'parallel',
+              'per_age_analysis', 'per_teacher_analysis', 'profiling', 'quantiles',
+              'schools_for_ages', 'service', 'population_pkg', 'schools_pkg')
+
+
+def __getattr__(name: str):
+    if name in SUBMODULES:
+        return importlib.import_module(f'{__name__}.{name}')
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(list(globals()) + list(SUBMODULES))
@@ -0,0 +1,160 @@
+"""
+Run the analysis for several combinations of data about schools and about
+population, listed in a JSON manifest:
+
+    {"outdir": "results",
+     "format": "xlsx",
+     "runs": [{"name": "2018", "schools": "data/schools_2018.xlsx",
+               "population": "data/population_2020", "reference_year": 2018},
+              {"name": "2019", "schools": "data/schools_2019.xlsx",
+               "population": "data/population_2021", "reference_year": 2019,
+               "population_year": 2021}]}
+
+Each distinct file with data about schools or population is parsed once and
+shared by all the runs using it. Results of each run are saved to a separate
+subdirectory of outdir.
+"""
+
+import json
+import os.path
+from concurrent.futures import ProcessPoolExecutor
+from src import cache, output, per_age_analysis, per_teacher_analysis
+from src.population_pkg.ages import POPULATION_YEAR, REFERENCE_YEAR
+from src.population_pkg import store as population_store
+from src.population_pkg.parsing import POPULATION_FILE
+
+OUTFILES = {'gmina': 'gmina_per_teacher', 'gminatype': 'gminatype_per_teacher',
+            'per_age': 'gminatype_per_age'}
+
+
+def load_manifest(manifest_path: str) -> dict:
+    """
+    Load the manifest and fill in the defaults. Relative paths are relative to
+    the directory of the manifest.
+
+    :param manifest_path: path to the JSON manifest
+    :return: manifest, with all the fields of each run
+    """
+    with open(manifest_path, encoding='utf-8') as file:
+        manifest = json.load(file)
+    base = os.path.dirname(os.path.abspath(manifest_path))
+
+    manifest['outdir'] = os.path.join(base, manifest.get('outdir', 'results'))
+    manifest['format'] = manifest.get('format', 'xlsx')
+    if manifest['format'] not in output.FORMATS:
+        raise ValueError(f'Unknown output format {manifest["format"]}, use one of: '
+                         f'{", ".join(output.FORMATS)}.')
+    if not isinstance(manifest.get('runs'), list):
+        raise ValueError(f'Manifest {manifest_path} has no list of runs.')
+
+    for run in manifest['runs']:
+        missing = {'schools', 'population'} - set(run)
+        if missing:
+            raise ValueError(f'Run {run} has no {", ".join(sorted(missing))}.')
+        run['schools'] = os.path.join(base, run['schools'])
+        run['population'] = os.path.join(base, run['population'])
+        run['reference_year'] = run.get('reference_year', REFERENCE_YEAR)
+        run['population_year'] = run.get('population_year', run['reference_year']
+                                         + POPULATION_YEAR - REFERENCE_YEAR)
+        run['name'] = str(run.get('name', f'{run["reference_year"]}_{run["population_year"]}'))
+        # Results are saved to outdir/name, so it must stay inside outdir
+        if run['name'] in ('', '.', '..') or '/' in run['name'] or '\\' in run['name']:
+            raise ValueError(f'Name of run {run["name"]!r} must be a plain name of a directory.')
+
+    names = [run['name'] for run in manifest['runs']]
+    duplicated = {name for name in names if names.count(name) > 1}
+    if duplicated:
+        raise ValueError(f'Names of runs must be unique, repeated: '
+                         f'{", ".join(sorted(duplicated))}.')
+    return manifest
+
+
+def prepare_inputs(manifest: dict, cache_dir: str = None) -> (dict, dict):
+    """
+    Parse each distinct file with data about schools and about population once.
+
+    :param manifest: manifest from load_manifest
+    :param cache_dir: directory with cached data and checkpoints, or None to parse
+        everything again
+    :return:
+        - dictionary path -> (schools for per teacher statistics, dropped
+          students, schools for per age statistics, dropped students)
+        - dictionary path -> store of population data
+    """
+    schools_inputs = {}
+    for schools_path in dict.fromkeys(run['schools'] for run in manifest['runs']):
+        # Checkpoints of each file are kept apart, so that they do not replace each other
+        input_cache_dir = cache.subdirectory(cache_dir, cache.source_name(schools_path))
+        schools_inputs[schools_path] = per_age_analysis.load_inputs(schools_path, input_cache_dir)
+
+    # Stores written to the cache are memory-mapped, and only their directory is
+    # sent to worker processes
+    populations = {}
+    for population_path in dict.fromkeys(run['population'] for run in manifest['runs']):
+        populations[population_path] = population_store.load_store(cache_dir, population_path)
+
+    return schools_inputs, populations
+
+
+def run_one(run: dict, schools_input: tuple, store: population_store.PopulationStore,
+            outdir: str, fmt: str, cache_dir: str = None,
+            relative_accuracy: float = None) -> float:
+    """
+    Calculate and save all the results of one run.
+
+    :param run: run from the manifest
+    :param schools_input: parsed data about schools, as from prepare_inputs
+    :param store: store of population data
+    :param outdir: directory for results of the run
+    :param fmt: format of the results
+    :param cache_dir: directory with checkpoints of the run, or None
+    :param relative_accuracy: None for exact medians, or relative error of
+        approximate medians
+    :return: percentage of information about students dropped
+    """
+    schools, dropped_1, schools_per_age, dropped_2 = schools_input
+    outpaths = {name: os.path.join(outdir, f'{outfile}.{fmt}')
+                for name, outfile in OUTFILES.items()}
+    os.makedirs(outdir, exist_ok=True)
+
+    per_teacher_analysis.save_statistics(schools, outpaths['gmina'], outpaths['gminatype'],
+                                         cache_dir, relative_accuracy)
+    dropped_2 += per_age_analysis.save_statistics(
+        schools_per_age, store, os.path.join(run['population'], POPULATION_FILE),
+        outpaths['per_age'], cache_dir, reference_year=run['reference_year'],
+        population_year=run['population_year'], relative_accuracy=relative_accuracy)
+
+    return (dropped_1 + dropped_2) / (schools['Uczniowie, wychow., słuchacze'].sum()
+                                      + dropped_1) * 100
+
+
+def run_batch(manifest: dict, cache_dir: str = None, workers: int = 1,
+              relative_accuracy: float = None) -> dict:
+    """
+    Run the analysis for all the runs in the manifest.
+
+    :param manifest: manifest from load_manifest
+    :param cache_dir: directory with cached data and checkpoints, or None to compute
+        everything again
+    :param workers: number of processes running the runs in parallel
+    :param relative_accuracy: None for exact medians, or relative error of
+        approximate medians
+    :return: dictionary name of run -> percentage of information about students dropped
+    """
+    runs = manifest['runs']
+    schools_inputs, populations = prepare_inputs(manifest, cache_dir)
+
+    args = [(run, schools_inputs[run['schools']], populations[run['population']],
+             os.path.join(manifest['outdir'], run['name']), manifest['format'],
+             cache.subdirectory(cache_dir, os.path.join('runs', run['name'])), relative_accuracy)
+            for run in runs]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            dropped = list(executor.map(run_one, *zip(*args)))
+    else:
+        dropped = [run_one(*run_args) for run_args in args]
+
+    for run, dropped_percentage in zip(runs, dropped):
+        print(f'{run["name"]}: {round(dropped_percentage, 2)}% of information about students '
+              f'dropped during all calculations.')
+    return {run['name']: dropped_percentage for run, dropped_percentage in zip(runs, dropped)}
@@ -0,0 +1,226 @@
+"""
+Provide content-addressed checkpoints of pipeline stages, so that only stages
+whose inputs changed are recomputed, and records of saved results, so that
+result files are not rewritten with the same data.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import pickle
+import pandas as pd
+
+# Change when checkpoints are stored differently; changes of the code of the
+# stages are found by code_version
+CHECKPOINT_VERSION = 2
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def fingerprint(path: str) -> str:
+    """
+    Calculate a key identifying the file: its path, size, modification time
+    and content.
+
+    :param path: path to the file
+    :return: hex digest of the key
+    """
+    stat = os.stat(path)
+    digest = hashlib.sha256()
+    digest.update(f'{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}|'.encode())
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def code_version(*paths: str) -> str:
+    """
+    Calculate a key identifying the source code, which changes with any change
+    of the code.
+
+    :param paths: source files, or directories with them; by default the whole package
+    :return: hex digest of the key
+    """
+    files = []
+    for path in paths or (PACKAGE_DIR,):
+        if os.path.isdir(path):
+            files += sorted(os.path.join(root, name) for root, _, names in os.walk(path)
+                            for name in names if name.endswith('.py'))
+        else:
+            files.append(path)
+
+    digest = hashlib.sha256()
+    for path in sorted(files):
+        digest.update(f'{os.path.relpath(path, PACKAGE_DIR)}|'.encode())
+        with open(path, 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def load_frame(cache_dir: str, name: str, key: str):
+    """
+    Load a dataframe stored under the name and key, if there is one.
+
+    :param cache_dir: directory with cached data
+    :param name: name of the cached entry
+    :param key: key the entry was stored with
+    :return: loaded dataframe, or None if it is not cached
+    """
+    path = os.path.join(cache_dir, f'{name}-{key}')
+    if os.path.exists(path + '.parquet'):
+        return pd.read_parquet(path + '.parquet')
+    if os.path.exists(path + '.pkl'):
+        with open(path + '.pkl', 'rb') as file:
+            return pickle.load(file)
+    return None
+
+
+def store_frame(cache_dir: str, name: str, key: str, frame: pd.DataFrame):
+    """
+    Store a dataframe under the name and key, replacing older entries with the
+    same name. Parquet is used when available, pickle otherwise.
+
+    :param cache_dir: directory with cached data
+    :param name: name of the cached entry
+    :param key: key to store the entry with
+    :param frame: dataframe to store
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    for entry in os.listdir(cache_dir):
+        if entry.startswith(f'{name}-'):
+            os.remove(os.path.join(cache_dir, entry))
+
+    path = os.path.join(cache_dir, f'{name}-{key}')
+    try:
+        frame.to_parquet(path + '.parquet')
+    except (ImportError, ValueError, TypeError):
+        # No parquet engine, or columns that parquet can't represent
+        if os.path.exists(path + '.parquet'):
+            os.remove(path + '.parquet')
+        with open(path + '.pkl', 'wb') as file:
+            pickle.dump(frame, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def source_name(source_path: str) -> str:
+    """
+    :param source_path: path to a source file
+    :return: name of cached entries derived from the file, distinct for files
+        with the same name in different directories
+    """
+    path_digest = hashlib.sha256(os.path.abspath(source_path).encode()).hexdigest()[:8]
+    return f'{os.path.basename(source_path)}.{path_digest}'
+
+
+def subdirectory(cache_dir: str, name: str) -> str:
+    """
+    :param cache_dir: directory with cached data, or None
+    :param name: name of the subdirectory
+    :return: subdirectory of the cache, keeping checkpoints of one input or run
+        apart from the others, or None if caching is disabled
+    """
+    return None if cache_dir is None else os.path.join(cache_dir, name)
+
+
+def frame_digest(frame: pd.DataFrame) -> str:
+    """
+    Calculate a key identifying the content of a dataframe: its values, index
+    and column names.
+
+    :param frame: any dataframe
+    :return: hex digest of the key
+    """
+    digest = hashlib.sha256(pd.util.hash_pandas_object(frame).to_numpy().tobytes())
+    digest.update(repr(list(frame.columns)).encode())
+    return digest.hexdigest()
+
+
+def input_key(stage: str, inputs: list) -> str:
+    """
+    Calculate a key identifying the stage, its inputs and the code of the
+    package, so that results are computed again after the code changes.
+
+    :param stage: name of the stage
+    :param inputs: paths to files, dataframes or numbers (or None) the stage depends on
+    :return: hex digest of the key
+    """
+    digest = hashlib.sha256(f'{CHECKPOINT_VERSION}|{code_version()}|{stage}'.encode())
+    for value in inputs:
+        if isinstance(value, pd.DataFrame):
+            digest.update(frame_digest(value).encode())
+        elif value is None or isinstance(value, (int, float)):
+            digest.update(f'|{value!r}'.encode())
+        else:
+            digest.update(fingerprint(value).encode())
+    return digest.hexdigest()
+
+
+def checkpoint(cache_dir: str, stage: str, inputs: list, compute, *args) -> (pd.DataFrame, int):
+    """
+    Return compute(*args), which gives a dataframe and how much data was
+    dropped, reusing its stored result as long as the inputs have not changed.
+
+    :param cache_dir: directory with cached data, or None to always compute
+    :param stage: name of the stage
+    :param inputs: paths to files, dataframes or numbers the stage depends on
+    :param compute: function performing the stage
+    :param args: arguments passed to compute
+    :return:
+        - dataframe computed by the stage
+        - how much data was dropped
+    """
+    if cache_dir is None:
+        return compute(*args)
+
+    key = input_key(stage, inputs)
+    meta_path = os.path.join(cache_dir, f'{stage}-{key}.json')
+    frame = load_frame(cache_dir, stage, key)
+    if frame is not None and os.path.exists(meta_path):
+        print(f'Inputs of {stage} have not changed, using its checkpoint...')
+        with open(meta_path, encoding='utf-8') as file:
+            return frame, json.load(file)['dropped']
+
+    frame, dropped = compute(*args)
+    store_frame(cache_dir, stage, key, frame)
+    with open(meta_path, 'w', encoding='utf-8') as file:
+        json.dump({'dropped': int(dropped)}, file)
+    return frame, dropped
+
+
+def save_if_changed(cache_dir: str, save, frame: pd.DataFrame, outfile: str, *args,
+                    **options):
+    """
+    Call save(frame, outfile, *args, **options), unless the file was already
+    saved from the same data and arguments and has not been modified since.
+
+    :param cache_dir: directory with cached data, or None to always save
+    :param save: function calculating results from the frame and saving them
+    :param frame: dataframe the results are calculated from
+    :param outfile: where to save results
+    :param args: numbers (or None) passed to save
+    :param options: passed to save, but not compared, since they do not change
+        the results (e.g. number of workers)
+    """
+    if cache_dir is None:
+        save(frame, outfile, *args, **options)
+        return
+
+    key = input_key(save.__name__, [frame, *args])
+    records_path = os.path.join(cache_dir, 'outputs.json')
+    records = {}
+    if os.path.exists(records_path):
+        with open(records_path, encoding='utf-8') as file:
+            records = json.load(file)
+
+    record = records.get(os.path.abspath(outfile))
+    if record is not None and record['key'] == key and os.path.exists(outfile) and \
+            record['fingerprint'] == fingerprint(outfile):
+        print(f'{outfile} is up to date.')
+        return
+
+    save(frame, outfile, *args, **options)
+    records[os.path.abspath(outfile)] = {'key': key, 'fingerprint': fingerprint(outfile)}
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(records_path, 'w', encoding='utf-8') as file:
+        json.dump(records, file, indent=2)
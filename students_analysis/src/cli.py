@@ -0,0 +1,61 @@
+"""
+Command line arguments of the program. Kept apart from the pipeline, so that
+--help does not need to import pandas.
+"""
+
+import argparse
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    :return: parser of the arguments of program.py
+    """
+    parser = argparse.ArgumentParser(description='')
+    parser.add_argument('schools_path', nargs='?', type=str,
+                        help='path to .xlsx file with schools data',
+                        default='data\\Wykaz_szkół_i_placówek_wg_stanu_na_30.IX._2018_w.5.xlsx')
+    parser.add_argument('population_path', nargs='?', type=str,
+                        help='path to directory with population data',
+                        default='data\\Ludność. Stan i struktura_30.06.2020')
+    parser.add_argument('outpath_gmina', nargs='?', type=str,
+                        help='where to save results of per teacher analysis, for each gmina',
+                        default='results\\gmina_per_teacher.xlsx')
+    parser.add_argument('outpath_gminatype', nargs='?', type=str,
+                        help='where to save results of per teacher analysis, in total',
+                        default='results\\gminatype_per_teacher.xlsx')
+    parser.add_argument('outpath_per_age', nargs='?', type=str,
+                        help='where to save results of per age analysis, in total',
+                        default='results\\gminatype_per_age.xlsx')
+    parser.add_argument('--format', type=str, nargs='+', metavar='FORMAT',
+                        help='format of results: xlsx, csv or parquet for all outputs, or '
+                        'OUTPUT=FORMAT with OUTPUT one of gmina, gminatype, per_age; by default '
+                        'given by extensions of output paths')
+    parser.add_argument('--batch', type=str, metavar='MANIFEST', help='run the analysis for all '
+                        'combinations of data listed in the JSON manifest, instead of the paths '
+                        'given as arguments')
+    parser.add_argument('--serve', type=int, metavar='PORT', help='instead of saving the results, '
+                        'keep them in memory and answer queries about them over HTTP on the '
+                        'local PORT')
+    parser.add_argument('--cache-dir', type=str, help='where to cache parsed input data',
+                        default='.cache')
+    parser.add_argument('--no-cache', action='store_true', help='parse input data again, '
+                        'without using the cache')
+    parser.add_argument('--workers', type=int, help='number of processes used to calculate '
+                        'gminas and voivodeships (or runs, with --batch) in parallel', default=1)
+    parser.add_argument('--parallel-backend', type=str, choices=['multiprocessing', 'dask'],
+                        default='multiprocessing', help='what runs per teacher statistics of '
+                        'groups of gminas in parallel, with --workers (dask must be installed)')
+    parser.add_argument('--out-of-core', type=int, metavar='PARTITIONS', help='split data about '
+                        'schools into PARTITIONS parts (e.g. 16) kept on disk, and keep only one '
+                        'of them (for each worker) in memory at a time')
+    parser.add_argument('--approximate-medians', type=float, metavar='ERROR', help='read medians '
+                        'from mergeable quantile sketches, with relative error at most ERROR '
+                        '(e.g. 0.01), instead of calculating them exactly')
+    parser.add_argument('--profile', type=str, metavar='REPORT', help='record time and rows of '
+                        'each stage, and peak memory of the program, and save them as JSON to '
+                        'REPORT')
+    parser.add_argument('--profile-memory', action='store_true', help='with --profile, also '
+                        'record peak memory allocated by each stage (several times slower)')
+    parser.add_argument('--cprofile', type=str, metavar='OUTFILE', help='with --profile, also dump '
+                        'cProfile statistics to OUTFILE')
+    return parser
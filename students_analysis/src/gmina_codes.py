@@ -0,0 +1,62 @@
+"""
+Provide integer representation of 7-digit gmina codes (TERYT), used to
+connect data about schools and population.
+
+Two digits for voivodeship, powiat and gmina each, and one for the type of
+gmina, are packed into one number, e.g. '0201011' -> 201011.
+"""
+
+import numpy as np
+import pandas as pd
+
+GMINA_TYPES = {'M': 1, 'Gm': 2, 'M-Gm': 3}
+GMINA_TYPE_NAMES = {number: name for name, number in GMINA_TYPES.items()}
+
+
+def encode(woj, pow_, gm, gmina_type) -> np.ndarray:
+    """
+    Pack parts of gmina codes into integers.
+
+    :param woj: voivodeship codes
+    :param pow_: powiat codes
+    :param gm: gmina codes, within powiat
+    :param gmina_type: types of gmina as numbers, 0 for unknown
+    :return: array of packed codes
+    """
+    woj, pow_, gm, gmina_type = (np.asarray(part, dtype=np.int32)
+                                 for part in [woj, pow_, gm, gmina_type])
+    return woj * 100000 + pow_ * 1000 + gm * 10 + gmina_type
+
+
+def decode(codes) -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray):
+    """
+    Unpack integer gmina codes.
+
+    :param codes: packed codes
+    :return: voivodeship, powiat, gmina and type codes
+    """
+    codes = np.asarray(codes)
+    return codes // 100000, codes // 1000 % 100, codes // 10 % 100, codes % 10
+
+
+def parse(codes: pd.Series) -> pd.Series:
+    """
+    Convert codes from official data, strings like '0201011' or numbers like
+    1261011, to integers.
+
+    :param codes: codes as read from the file
+    :return: integer codes, NaN where the value is not a code
+    """
+    return pd.to_numeric(codes.astype(str).str.strip(), errors='coerce')
+
+
+def format_codes(codes):
+    """
+    Format integer codes as 7-digit strings, for output.
+
+    :param codes: a packed code, or an array of them
+    :return: a string, or an index of strings
+    """
+    if np.isscalar(codes):
+        return f'{int(codes):07d}'
+    return pd.Index(codes).astype(str).str.zfill(7)
@@ -0,0 +1,183 @@
+"""
+Run the analysis on data about schools too large to keep in memory at once.
+
+The sheet is read chunk by chunk. Each chunk, without duplicate REGONs and
+delegatures, is split by a hash of 'Regon jednostki sprawozdawczej' into
+partitions spilled to disk, so that facilities sharing teachers are always in
+the same partition and teachers are reallocated as with all the data at once.
+Each partition is then loaded on its own and reduced to mergeable aggregates:
+of per teacher statistics in each gmina and type of gmina, and of students
+and schools of each type in each gmina for per age statistics. Only one
+partition for each worker process is in memory at a time.
+"""
+
+import os.path
+import pickle
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
+import pandas as pd
+from src import output, per_age_analysis, per_teacher_analysis
+from src.population_pkg import store as population_store
+from src.population_pkg.parsing import POPULATION_FILE
+from src.schools_pkg import parsing, schema
+from src.schools_pkg.calculate import merge_statistics, partial_statistics
+from src.schools_pkg.save import GMINA_COLS, GMINATYPE_COLS
+import src.schools_for_ages as sfa
+
+PARTITIONS = 16
+# Columns used by the calculations; the other columns are not spilled
+SPILL_COLS = ['Regon', 'woj', 'pow', 'gm', 'Województwo', 'Powiat', 'Gmina', 'Typ gminy',
+              'Nazwa typu', 'Złożoność', 'Uczniowie, wychow., słuchacze',
+              'w tym w oddziałach przedszk.', 'Oddziały', 'Nauczyciele pełnozatrudnieni',
+              'Nauczyciele niepełnozatrudnieni (w etatach)', 'Regon jednostki sprawozdawczej']
+
+
+def partition_of(regons: np.ndarray, partitions: int) -> np.ndarray:
+    """
+    :param regons: REGONs of reporting units of schools
+    :param partitions: number of partitions
+    :return: partition of each school
+    """
+    return (pd.util.hash_array(regons) % partitions).astype(np.int64)
+
+
+def spill_partitions(schools_path: str, directory: str, partitions: int,
+                     chunk_rows: int = parsing.CHUNK_ROWS) -> (list, int):
+    """
+    Read data about schools chunk by chunk and append the rows of each
+    partition to its own file.
+
+    :param schools_path: where data about schools is located
+    :param directory: where to save the partitions
+    :param partitions: number of partitions
+    :param chunk_rows: number of rows read at once
+    :return:
+        - paths to files of partitions with any schools, or of one empty
+          partition if no schools are left
+        - how many students were dropped while reading
+    """
+    paths = [os.path.join(directory, f'partition-{part}.pkl') for part in range(partitions)]
+    used = set()
+    students_dropped = 0
+    files = [open(path, 'wb') for path in paths]
+    try:
+        for chunk, dropped_now in parsing.iter_clean_chunks(schools_path, chunk_rows):
+            students_dropped += dropped_now
+            chunk = chunk[SPILL_COLS]
+            parts = partition_of(chunk['Regon jednostki sprawozdawczej'].to_numpy(
+                dtype=np.int64, na_value=-1), partitions)
+            for part, rows in chunk.groupby(parts):
+                pickle.dump(rows, files[part], protocol=pickle.HIGHEST_PROTOCOL)
+                used.add(part)
+    finally:
+        for file in files:
+            file.close()
+    # With no schools, statistics are calculated from an empty partition, as
+    # from an empty dataframe without partitions
+    return [paths[part] for part in sorted(used)] or paths[:1], students_dropped
+
+
+def load_partition(path: str) -> pd.DataFrame:
+    """
+    :param path: file of a partition saved by spill_partitions
+    :return: dataframe with REGON as index, with compact dtypes; without rows
+        if the file is empty
+    """
+    chunks = []
+    with open(path, 'rb') as file:
+        while True:
+            try:
+                chunks.append(pickle.load(file))
+            except EOFError:
+                break
+    schools = pd.concat(chunks or [pd.DataFrame(columns=SPILL_COLS)]).set_index('Regon')
+    return schools.astype({column: dtype for column, dtype in schema.SCHOOLS_DTYPES.items()
+                           if column in schools.columns})
+
+
+def reduce_partition(path: str, relative_accuracy: float = None) -> dict:
+    """
+    Calculate mergeable aggregates of the schools in a partition.
+
+    :param path: file of a partition saved by spill_partitions
+    :param relative_accuracy: None for exact medians, or relative error of
+        approximate medians
+    :return: dictionary with partial statistics of gminas and types of gmina,
+        students and schools of each type in each gmina, students kept and
+        students dropped from per teacher and per age statistics, and problems
+        found in the data, which are printed for all the partitions by run
+    """
+    schools = load_partition(path)
+    students_at_start = schools['Uczniowie, wychow., słuchacze'].sum()
+    schools, (bad_regons, bad_regon_count) = per_teacher_analysis.students_per_teacher(
+        schools, report=False)
+    students = schools['Uczniowie, wychow., słuchacze'].sum()
+
+    normalized, dropped_per_age = sfa.normalize_schools(schools, report=False)
+    return {'gmina': partial_statistics(schools, GMINA_COLS, relative_accuracy),
+            'gminatype': partial_statistics(schools, GMINATYPE_COLS, relative_accuracy),
+            'per_age': sfa.trim_schools_for_population(normalized),
+            'students': students, 'dropped_per_teacher': students_at_start - students,
+            'dropped_per_age': dropped_per_age, 'bad_regons': bad_regons,
+            'bad_regon_count': bad_regon_count,
+            'unclear_schools': normalized['Nazwa typu'].isna().sum()}
+
+
+def run(schools_path: str, population_path: str, outpath_gmina: str, outpath_gminatype: str,
+        outpath_per_age: str, cache_dir: str = None, workers: int = 1,
+        partitions: int = PARTITIONS, relative_accuracy: float = None,
+        spill_dir: str = None) -> (int, int, int):
+    """
+    Perform per teacher and per age analysis, keeping only a partition of the
+    data about schools in memory at a time.
+
+    :param schools_path: path to file with data about schools
+    :param population_path: directory with data about population
+    :param outpath_gmina: where to save per teacher results for all gminas
+    :param outpath_gminatype: where to save per teacher results for gminas grouped by their type
+    :param outpath_per_age: where to save per age results
+    :param cache_dir: directory with cached population data and outputs, or None
+    :param workers: number of processes reducing partitions in parallel
+    :param partitions: number of partitions of the data about schools
+    :param relative_accuracy: None for exact medians, or relative error of
+        approximate medians
+    :param spill_dir: where to keep partitions while they are used, by default
+        a temporary directory
+    :return:
+        - number of students in schools used in per teacher statistics
+        - how much data was dropped from per teacher statistics
+        - how much data was dropped from per age statistics
+    """
+    with tempfile.TemporaryDirectory(dir=spill_dir) as directory:
+        paths, dropped_per_teacher = spill_partitions(schools_path, directory, partitions)
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                reduced = list(executor.map(reduce_partition, paths, repeat(relative_accuracy)))
+        else:
+            reduced = [reduce_partition(path, relative_accuracy) for path in paths]
+
+    students = sum(part['students'] for part in reduced)
+    dropped_per_teacher += sum(part['dropped_per_teacher'] for part in reduced)
+    dropped_per_age = sum(part['dropped_per_age'] for part in reduced)
+    # Reported once for all the partitions, as without partitions
+    parsing.print_reallocation_report(
+        [regon for part in reduced for regon in part['bad_regons']],
+        sum(part['bad_regon_count'] for part in reduced))
+    sfa.print_unclear_report(dropped_per_age, sum(part['unclear_schools'] for part in reduced))
+
+    for outpath, name in [(outpath_gmina, 'gmina'), (outpath_gminatype, 'gminatype')]:
+        print(f'Printing out to {outpath}...')
+        output.write_frame(merge_statistics([part[name] for part in reduced]), outpath)
+
+    per_age = pd.concat([part['per_age'] for part in reduced])
+    per_age = per_age.groupby(level=list(range(per_age.index.nlevels)),
+                              observed=True).sum().sort_index()
+    per_age = sfa.reallocate_preschool(per_age)
+
+    store = population_store.load_store(cache_dir, population_path)
+    dropped_per_age += per_age_analysis.save_statistics(
+        per_age, store, os.path.join(population_path, POPULATION_FILE), outpath_per_age,
+        cache_dir, workers, relative_accuracy=relative_accuracy)
+    return students, dropped_per_teacher, dropped_per_age
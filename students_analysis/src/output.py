@@ -0,0 +1,126 @@
+"""
+Write result tables as .xlsx, .csv or .parquet files. Workbooks are written
+row by row in constant memory, instead of being built whole before saving.
+"""
+
+import os.path
+import pandas as pd
+
+FORMATS = ('xlsx', 'csv', 'parquet')
+SHEET_NAME = 'Sheet1'
+# Rows converted to Python objects at once while writing a workbook
+CHUNK_ROWS = 10000
+
+
+def infer_format(outfile: str) -> str:
+    """
+    Recognize the output format from the extension of the file.
+
+    :param outfile: path to the output file
+    :return: one of FORMATS
+    """
+    extension = os.path.splitext(outfile)[1].lower().lstrip('.')
+    if extension == 'xls':
+        # Workbooks are always written as .xlsx, which would be misnamed
+        raise ValueError(f'Old .xls workbooks can not be written, save {outfile} as .xlsx.')
+    if extension not in FORMATS:
+        raise ValueError(f'Unknown output format of {outfile}, use one of: {", ".join(FORMATS)}.')
+    return extension
+
+
+def with_format(outfile: str, fmt: str) -> str:
+    """
+    Change the extension of the output file to match the format.
+
+    :param outfile: path to the output file
+    :param fmt: one of FORMATS, or None to keep the path
+    :return: path with the extension of the format
+    """
+    if fmt is None:
+        return outfile
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown output format {fmt}, use one of: {", ".join(FORMATS)}.')
+    return os.path.splitext(outfile)[0] + '.' + fmt
+
+
+def iter_rows(frame: pd.DataFrame):
+    """
+    Yield the header and the rows of the frame as lists of Python objects, with
+    index levels as leading columns and missing values as None.
+
+    :param frame: dataframe to write
+    """
+    flat = frame.reset_index()
+    yield [str(name) for name in flat.columns]
+    for start in range(0, len(flat), CHUNK_ROWS):
+        chunk = flat.iloc[start:start + CHUNK_ROWS].astype(object)
+        yield from chunk.where(chunk.notna(), None).values.tolist()
+
+
+def write_xlsx(frame: pd.DataFrame, outfile: str):
+    """
+    Write the frame to a workbook row by row, in constant memory. xlsxwriter is
+    used when it is installed, openpyxl in write-only mode otherwise.
+
+    :param frame: dataframe to write
+    :param outfile: where to save the workbook
+    """
+    try:
+        import xlsxwriter
+    except ImportError:
+        xlsxwriter = None
+
+    if xlsxwriter is not None:
+        with xlsxwriter.Workbook(outfile, {'constant_memory': True}) as workbook:
+            worksheet = workbook.add_worksheet(SHEET_NAME)
+            for row_number, row in enumerate(iter_rows(frame)):
+                worksheet.write_row(row_number, 0, row)
+        return
+
+    import openpyxl
+    workbook = openpyxl.Workbook(write_only=True)
+    worksheet = workbook.create_sheet(SHEET_NAME)
+    for row in iter_rows(frame):
+        worksheet.append(row)
+    workbook.save(outfile)
+
+
+def write_frame(frame: pd.DataFrame, outfile: str):
+    """
+    Save results to the file, in the format given by its extension. Index
+    levels are saved as leading columns.
+
+    :param frame: dataframe with results
+    :param outfile: where to save results
+    """
+    fmt = infer_format(outfile)
+    if fmt == 'xlsx':
+        write_xlsx(frame, outfile)
+    elif fmt == 'csv':
+        frame.to_csv(outfile)
+    else:
+        # Parquet needs string column names
+        frame.rename(columns=str).to_parquet(outfile)
+
+
+def parse_formats(values: list, outputs: list) -> dict:
+    """
+    Decide the format of each output from the values of --format, which are
+    either a format for all outputs, or OUTPUT=FORMAT for a single one.
+
+    :param values: values given by the user, or None
+    :param outputs: names of outputs
+    :return: dictionary output name -> format, or None to use the extension
+    """
+    formats = dict.fromkeys(outputs)
+    for value in values or []:
+        name, _, fmt = value.rpartition('=')
+        if fmt not in FORMATS:
+            raise ValueError(f'Unknown output format {fmt}, use one of: {", ".join(FORMATS)}.')
+        if not name:
+            formats = dict.fromkeys(outputs, fmt)
+        elif name in formats:
+            formats[name] = fmt
+        else:
+            raise ValueError(f'Unknown output {name}, use one of: {", ".join(outputs)}.')
+    return formats
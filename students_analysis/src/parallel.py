@@ -0,0 +1,86 @@
+"""
+Apply a function to groups of rows in parallel, in worker processes.
+
+Rows are split into partitions by a hash of the columns identifying a group,
+so all the rows of a group are in the same partition, in their original order.
+The function is applied to each partition on its own and the results are
+concatenated and sorted. As every group is calculated from the same values in
+the same order as without partitions, the results are the same bit for bit.
+
+Partitions are calculated by a ProcessPoolExecutor, or by dask (with its
+processes scheduler) when it is installed and chosen as the backend.
+"""
+
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
+import pandas as pd
+
+BACKENDS = ('multiprocessing', 'dask')
+DEFAULT_BACKEND = 'multiprocessing'
+
+
+def available_backends() -> list:
+    """
+    :return: backends which can be used, dask only if it is installed
+    """
+    return [backend for backend in BACKENDS
+            if backend == DEFAULT_BACKEND or importlib.util.find_spec(backend) is not None]
+
+
+def partition_rows(frame: pd.DataFrame, key_cols: list, partitions: int) -> list:
+    """
+    :param frame: dataframe to split
+    :param key_cols: columns identifying a group
+    :param partitions: number of partitions
+    :return: non-empty partitions of the frame, each with rows in their
+        original order; all rows of a group are in the same partition
+    """
+    parts = pd.util.hash_pandas_object(frame[key_cols], index=False).to_numpy() % partitions
+    return [frame.take(np.flatnonzero(parts == part)) for part in range(partitions)
+            if (parts == part).any()]
+
+
+def map_partitions(function, parts: list, workers: int, backend: str = DEFAULT_BACKEND,
+                   *args) -> list:
+    """
+    :param function: function called with each partition and args, defined at
+        module level so that it can be sent to worker processes
+    :param parts: partitions of data
+    :param workers: number of worker processes
+    :param backend: 'multiprocessing' or 'dask'
+    :param args: further arguments of the function
+    :return: results for each partition, in the same order
+    """
+    if backend not in available_backends():
+        raise ValueError(f'Unknown or not installed backend {backend}, use one of: '
+                         f'{", ".join(available_backends())}.')
+    if backend == 'dask':
+        import dask
+        tasks = [dask.delayed(function)(part, *args) for part in parts]
+        return list(dask.compute(*tasks, scheduler='processes', num_workers=workers))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(function, parts, *[repeat(arg) for arg in args]))
+
+
+def apply_by_groups(function, frame: pd.DataFrame, key_cols: list, workers: int,
+                    backend: str = DEFAULT_BACKEND, *args) -> pd.DataFrame:
+    """
+    Calculate function(frame, *args) for a function calculating each group on
+    its own, by applying it to partitions of the frame in parallel.
+
+    :param function: function returning a dataframe indexed by groups, defined
+        at module level
+    :param frame: dataframe with rows of the groups
+    :param key_cols: columns identifying a group, or a part of them
+    :param workers: number of worker processes, and of partitions
+    :param backend: 'multiprocessing' or 'dask'
+    :param args: further arguments of the function
+    :return: results of all the partitions, sorted by their index
+    """
+    parts = partition_rows(frame, key_cols, workers)
+    if len(parts) < 2:
+        return function(frame, *args)
+    return pd.concat(map_partitions(function, parts, workers, backend, *args)).sort_index()
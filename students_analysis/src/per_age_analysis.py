@@ -3,36 +3,157 @@ Using schools df from per_teacher_analysis, modify it, then calculate and
 save per age statistics.
 """
 
+import os.path
 import pandas as pd
-from src.population_pkg.calculate import students_per_age
+from src import cache, per_teacher_analysis
+from src.population_pkg.ages import POPULATION_YEAR, REFERENCE_YEAR
+from src.population_pkg import store as population_store
+from src.population_pkg.calculate import students_per_age_from_store
+from src.population_pkg.parsing import POPULATION_FILE
 from src.population_pkg.save import save_per_age_statistics
+from src.profiling import stage
 import src.schools_for_ages as sfa
 
 
-def run(schools: pd.DataFrame, population_path: str, outpath_per_age: str) -> int:
+def prepare_per_age_input(schools: pd.DataFrame) -> (pd.DataFrame, int):
     """
-    Perform per age analysis.
+    Modify schools df from per_teacher_analysis, so that it has number of
+    students and schools of each type in each gmina.
 
-    :param schools: pd.DataFrame from per_teacher_analysis
-    :param population_path: directory with data about population
+    :param schools: pd.DataFrame from per_teacher_analysis, left as it was
+    :return:
+        - new dataframe
+        - how much data was dropped
+    """
+    schools, dropped_now = stage('normalize schools', sfa.normalize_schools, schools)
+    schools = stage('trim schools', sfa.trim_schools_for_population, schools)
+    schools = stage('reallocate preschool', sfa.reallocate_preschool, schools)
+
+    return schools, dropped_now
+
+
+def load_per_age_input(schools: pd.DataFrame, cache_dir: str = None) -> (pd.DataFrame, int):
+    """
+    Same as prepare_per_age_input, but read from the checkpoint if the schools
+    did not change.
+
+    :param schools: pd.DataFrame from per_teacher_analysis, left as it was
+    :param cache_dir: directory with checkpoints, or None to prepare the data again
+    :return: as from prepare_per_age_input
+    """
+    return cache.checkpoint(cache_dir, 'per_age_input', [schools], prepare_per_age_input,
+                            schools)
+
+
+def load_inputs(schools_path: str, cache_dir: str = None) -> (pd.DataFrame, int, pd.DataFrame,
+                                                              int):
+    """
+    Prepare data about schools both for per teacher and per age statistics.
+
+    :param schools_path: path to file with data about schools
+    :param cache_dir: directory with checkpoints, or None to prepare the data again
+    :return:
+        - pd.DataFrame for per teacher statistics
+        - how much data was dropped preparing it
+        - pd.DataFrame for per age statistics
+        - how much more data was dropped preparing it
+    """
+    schools, dropped_1 = per_teacher_analysis.load_schools(schools_path, cache_dir)
+    schools_per_age, dropped_2 = load_per_age_input(schools, cache_dir)
+    return schools, dropped_1, schools_per_age, dropped_2
+
+
+def students_per_year(schools: pd.DataFrame, store: population_store.PopulationStore,
+                      population_file: str, cache_dir: str = None, workers: int = 1,
+                      reference_year: int = REFERENCE_YEAR,
+                      population_year: int = None) -> (pd.DataFrame, int):
+    """
+    Calculate how many students per school are there for each year of birth in
+    each gmina.
+
+    :param schools: pd.DataFrame from prepare_per_age_input
+    :param store: store of population data
+    :param population_file: file the population data was loaded from
+    :param cache_dir: directory with cached data and checkpoints, or None to compute
+        everything again
+    :param workers: number of processes to use for per age calculations
+    :param reference_year: year of the data about schools
+    :param population_year: year of the data about population; by default as many
+        years later than the data about schools as in the official data
+    :return:
+        - dataframe with students per school for each year of birth (columns)
+        - how much data was dropped
+    """
+    if population_year is None:
+        population_year = reference_year + POPULATION_YEAR - REFERENCE_YEAR
+    years_shift = population_year - reference_year
+
+    per_age, dropped_now = stage('students per age', cache.checkpoint, cache_dir, 'per_age',
+                                 [schools, population_file, years_shift],
+                                 students_per_age_from_store, schools, store, workers,
+                                 years_shift)
+
+    # Convert ages to year of birth
+    per_age.columns = per_age.columns.map(lambda x: reference_year - x)
+    return per_age, dropped_now
+
+
+def save_statistics(schools: pd.DataFrame, store: population_store.PopulationStore,
+                    population_file: str, outpath_per_age: str, cache_dir: str = None,
+                    workers: int = 1, reference_year: int = REFERENCE_YEAR,
+                    population_year: int = None, relative_accuracy: float = None) -> int:
+    """
+    Calculate and save per age statistics.
+
+    :param schools: pd.DataFrame from prepare_per_age_input
+    :param store: store of population data
+    :param population_file: file the population data was loaded from
     :param outpath_per_age: where to save the results
+    :param cache_dir: directory with cached data and checkpoints, or None to compute
+        everything again
+    :param workers: number of processes to use for per age calculations
+    :param reference_year: year of the data about schools
+    :param population_year: year of the data about population; by default as many
+        years later than the data about schools as in the official data
+    :param relative_accuracy: None for exact medians, or relative error of
+        approximate medians
     :return: how much data was dropped
     """
-    all_dropped = 0
+    per_age, dropped_now = students_per_year(schools, store, population_file, cache_dir, workers,
+                                             reference_year, population_year)
+    stage('save per age statistics', cache.save_if_changed, cache_dir, save_per_age_statistics,
+          per_age, outpath_per_age, relative_accuracy)
 
-    dropped_now = sfa.simplify_school_types(schools)
-    all_dropped += dropped_now
+    return dropped_now
 
-    sfa.update_with_gmina_codes(schools)
-    sfa.update_voivodeship_names(schools)
-    schools = sfa.trim_schools_for_population(schools)
-    schools = sfa.reallocate_preschool(schools)
 
-    per_age, dropped_now = students_per_age(schools, population_path)
-    all_dropped += dropped_now
+def run(schools: pd.DataFrame, population_path: str, outpath_per_age: str,
+        cache_dir: str = None, workers: int = 1, reference_year: int = REFERENCE_YEAR,
+        population_year: int = None, relative_accuracy: float = None) -> int:
+    """
+    Perform per age analysis.
+
+    With cache_dir, each stage is recomputed only if its inputs changed.
+
+    :param schools: pd.DataFrame from per_teacher_analysis
+    :param population_path: directory with data about population
+    :param outpath_per_age: where to save the results
+    :param cache_dir: directory with cached data and checkpoints, or None to compute
+        everything again
+    :param workers: number of processes to use for per age calculations
+    :param reference_year: year of the data about schools
+    :param population_year: year of the data about population; by default as many
+        years later than the data about schools as in the official data
+    :param relative_accuracy: None for exact medians, or relative error of
+        approximate medians
+    :return: how much data was dropped
+    """
+    schools, all_dropped = load_per_age_input(schools, cache_dir)
 
-    # Convert ages to year of birth (and the main data is from 2018)
-    per_age.columns = per_age.columns.map(lambda x: 2018 - x)
-    save_per_age_statistics(per_age, outpath_per_age)
+    population_file = os.path.join(population_path, POPULATION_FILE)
+    store = stage('load population', population_store.load_store, cache_dir, population_path)
+    all_dropped += save_statistics(schools, store, population_file, outpath_per_age,
+                                   cache_dir, workers, reference_year, population_year,
+                                   relative_accuracy)
 
     return all_dropped
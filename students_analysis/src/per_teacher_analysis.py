@@ -4,36 +4,117 @@ per teacher statistics.
 """
 
 import pandas as pd
+from src import cache, parallel
+from src.profiling import stage
 import src.schools_pkg.parsing as parsing
 from src.schools_pkg.save import save_gmina_statistics
 from src.schools_pkg.save import save_gminatype_statistics
 
 
-def run(schools_path: str, outpath_gmina: str, outpath_gminatype: str) -> (pd.DataFrame, int):
+def prepare_schools(schools_path: str) -> (pd.DataFrame, int):
     """
-    Perform per teacher analysis.
+    Load data about schools from the path, clean it and calculate number of
+    students per teacher in each school.
 
     :param schools_path: path to file with data about schools
-    :param outpath_gmina: where to save results for all gminas
-    :param outpath_gminatype: where to save results for gminas grouped by their type
     :return:
         - pd.DataFrame with data for further calculations
         - how much data was dropped
     """
-    schools = parsing.load_schools_df(schools_path)
-    students_at_start = schools['Uczniowie, wychow., słuchacze'].sum()
+    # Duplicate REGONs and delegatures are dropped while the sheet is read
+    schools, students_dropped = stage('load schools', parsing.stream_schools_df, schools_path)
+    students_at_start = schools['Uczniowie, wychow., słuchacze'].sum() + students_dropped
+
+    schools, _ = students_per_teacher(schools)
+    students_dropped = students_at_start - schools['Uczniowie, wychow., słuchacze'].sum()
+
+    return schools, students_dropped
+
+
+def load_schools(schools_path: str, cache_dir: str = None) -> (pd.DataFrame, int):
+    """
+    Same as prepare_schools, but read from the checkpoint if the file did not change.
 
-    schools = parsing.set_regon_as_index(schools)
-    schools = parsing.drop_delegatures(schools)
-    schools = parsing.sum_teachers(schools)
-    parsing.reallocate_teachers_per_regon(schools)
+    :param schools_path: path to file with data about schools
+    :param cache_dir: directory with checkpoints, or None to prepare the data again
+    :return: as from prepare_schools
+    """
+    return cache.checkpoint(cache_dir, 'schools_per_teacher', [schools_path], prepare_schools,
+                            schools_path)
+
+
+def students_per_teacher(schools: pd.DataFrame, report: bool = True) -> (pd.DataFrame, tuple):
+    """
+    Sum and reallocate teachers, drop schools with no students and calculate
+    number of students per teacher in each school.
+
+    Teachers are reallocated between facilities with the same 'Regon jednostki
+    sprawozdawczej', so all of them must be in the dataframe.
+
+    :param schools: data about schools, without duplicate REGONs and delegatures
+    :param report: whether to print problems found while reallocating teachers
+    :return:
+        - new dataframe
+        - problems found while reallocating teachers (see
+          parsing.reallocate_teachers_per_regon)
+    """
+    # Each stage either returns a new dataframe or edits in place the one
+    # returned by the previous stage, which nothing else refers to
+    schools = stage('sum teachers', parsing.sum_teachers, schools)
+    reallocation_report = stage('reallocate teachers', parsing.reallocate_teachers_per_regon,
+                                schools, report)
     # After reallocating teachers, we can freely discard data from schools with no students
-    schools = schools.loc[schools['Uczniowie, wychow., słuchacze'] > 0]
-    parsing.students_per_teachers_in_school(schools)
+    schools = stage('drop schools without students', parsing.drop_schools_without_students,
+                    schools)
+    stage('students per teacher', parsing.students_per_teachers_in_school, schools)
+    return schools, reallocation_report
 
-    save_gmina_statistics(schools, outpath_gmina)
-    save_gminatype_statistics(schools, outpath_gminatype)
 
-    students_dropped = students_at_start - schools['Uczniowie, wychow., słuchacze'].sum()
+def save_statistics(schools: pd.DataFrame, outpath_gmina: str, outpath_gminatype: str,
+                    cache_dir: str = None, relative_accuracy: float = None, workers: int = 1,
+                    backend: str = parallel.DEFAULT_BACKEND):
+    """
+    Calculate and save per teacher statistics.
+
+    :param schools: pd.DataFrame from prepare_schools
+    :param outpath_gmina: where to save results for all gminas
+    :param outpath_gminatype: where to save results for gminas grouped by their type
+    :param cache_dir: directory with cached data and checkpoints, or None to save
+        the results again
+    :param relative_accuracy: None for exact medians, or relative error of
+        approximate medians
+    :param workers: number of processes calculating gminas
+    :param backend: 'multiprocessing' or 'dask'
+    """
+    stage('save gmina statistics', cache.save_if_changed, cache_dir, save_gmina_statistics,
+          schools, outpath_gmina, relative_accuracy, workers=workers, backend=backend)
+    stage('save gminatype statistics', cache.save_if_changed, cache_dir,
+          save_gminatype_statistics, schools, outpath_gminatype, relative_accuracy)
+
+
+def run(schools_path: str, outpath_gmina: str, outpath_gminatype: str,
+        cache_dir: str = None, relative_accuracy: float = None, workers: int = 1,
+        backend: str = parallel.DEFAULT_BACKEND) -> (pd.DataFrame, int):
+    """
+    Perform per teacher analysis.
+
+    With cache_dir, each stage is recomputed only if its inputs changed.
+
+    :param schools_path: path to file with data about schools
+    :param outpath_gmina: where to save results for all gminas
+    :param outpath_gminatype: where to save results for gminas grouped by their type
+    :param cache_dir: directory with cached data and checkpoints, or None to compute
+        everything again
+    :param relative_accuracy: None for exact medians, or relative error of
+        approximate medians
+    :param workers: number of processes calculating gminas
+    :param backend: 'multiprocessing' or 'dask'
+    :return:
+        - pd.DataFrame with data for further calculations
+        - how much data was dropped
+    """
+    schools, students_dropped = load_schools(schools_path, cache_dir)
+    save_statistics(schools, outpath_gmina, outpath_gminatype, cache_dir, relative_accuracy,
+                    workers, backend)
 
     return schools, students_dropped
@@ -2,6 +2,16 @@
 Handle official data about population for per age statistics.
 """
 
-import src.population_pkg.calculate
-import src.population_pkg.parsing
-import src.population_pkg.save
+import importlib
+
+SUBMODULES = ('ages', 'calculate', 'parsing', 'save', 'store')
+
+
+def __getattr__(name: str):
+    if name in SUBMODULES:
+        return importlib.import_module(f'{__name__}.{name}')
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(list(globals()) + list(SUBMODULES))
@@ -0,0 +1,45 @@
+"""
+Provide age ranges of students of each type of school. Kept apart from the
+calculations, so that it can be used without importing pandas.
+"""
+
+# Years of the official data about schools and about population
+REFERENCE_YEAR = 2018
+POPULATION_YEAR = 2020
+
+
+def agerange_for_school() -> dict:
+    """
+    Create a dictionary with age range for each type of school.
+
+    :return: a dictionary with age range for each type of school
+    """
+    school_ages = {}
+    school_ages['Przedszkole'] = list(range(3, 7))
+    school_ages['Szkoła podstawowa'] = list(range(7, 15))
+    school_ages['Gimnazjum'] = list(range(13, 16))
+    school_ages['Zawodówka'] = list(range(15, 18))
+    school_ages['Dziewięcioletnia ogólnokształcąca szkoła baletowa'] = list(range(10, 19))
+    school_ages['Sześcioletnia ogólnokształcąca szkoła sztuk pięknych'] = list(range(13, 19))
+    school_ages['Liceum ogólnokształcące'] = list(range(15, 19))
+    school_ages['Technikum'] = list(range(15, 20))
+    return school_ages
+
+
+def ages_in_population(years_shift: int) -> list:
+    """
+    :param years_shift: how many years later than data about schools the data
+        about population is
+    :return: ages in population data of people who were of school age (as
+        given by agerange_for_school) in the year of data about schools
+    """
+    school_ages = [age for ages in agerange_for_school().values() for age in ages]
+    return list(range(min(school_ages) + years_shift, max(school_ages) + years_shift + 1))
+
+
+def age_label(age: int) -> str:
+    """
+    :param age: age in years
+    :return: label of the age in population data, in form of '       2 ' or '       22'
+    """
+    return str(age).ljust(2).rjust(9)
@@ -3,109 +3,251 @@ Provide methods used to calculate max, min, median, mean of the number of
 students per school for each year of birth in different types of gminas.
 """
 
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
-from src.population_pkg import parsing
+from src import gmina_codes, quantiles
+from src.population_pkg import store as population_store
+from src.population_pkg.ages import POPULATION_YEAR, REFERENCE_YEAR
+from src.population_pkg.ages import age_label, agerange_for_school, ages_in_population
 
 
-def agerange_for_school() -> dict:
+def students_per_age(schools: pd.DataFrame, population_path: str, cache_dir: str = None,
+                     workers: int = 1, years_shift: int = POPULATION_YEAR - REFERENCE_YEAR
+                     ) -> (pd.DataFrame, int):
     """
-    Create a dictionary with age range for each type of school.
+    Calculate how much students are there in each gmina for each age. Drop
+    gmina if unable to locate data about population for this code.
 
-    :return: a dictionary with age range for each type of school
+    :param schools: dataframe with data about schools
+    :param population_path: where data about population is located
+    :param cache_dir: directory with cached parsed data, or None to parse it again
+    :param workers: number of processes to use
+    :param years_shift: how many years later than data about schools the data
+        about population is
+    :return:
+        - dataframe with how many students are there for each age
+        - how much data was dropped
     """
-    school_ages = {}
-    school_ages['Przedszkole'] = list(range(3, 7))
-    school_ages['Szkoła podstawowa'] = list(range(7, 15))
-    school_ages['Gimnazjum'] = list(range(13, 16))
-    school_ages['Zawodówka'] = list(range(15, 18))
-    school_ages['Dziewięcioletnia ogólnokształcąca szkoła baletowa'] = list(range(10, 19))
-    school_ages['Sześcioletnia ogólnokształcąca szkoła sztuk pięknych'] = list(range(13, 19))
-    school_ages['Liceum ogólnokształcące'] = list(range(15, 19))
-    school_ages['Technikum'] = list(range(15, 20))
-    return school_ages
+    store = population_store.load_store(cache_dir, population_path)
+    return students_per_age_from_store(schools, store, workers, years_shift)
 
 
-def students_per_age(schools: pd.DataFrame, population_path: str) -> (pd.DataFrame, int):
+def students_per_age_from_population(schools: pd.DataFrame, population: pd.DataFrame,
+                                     workers: int = 1,
+                                     years_shift: int = POPULATION_YEAR - REFERENCE_YEAR
+                                     ) -> (pd.DataFrame, int):
     """
-    Calculate how much students are there in each gmina for each age. Drop
-    gmina if unable to locate data about population for this code.
+    Calculate how much students are there in each gmina for each age, using
+    already loaded population data. Drop gmina if unable to locate data about
+    population for this code.
 
     :param schools: dataframe with data about schools
-    :param population_path: where data about population is located
+    :param population: dataframe from parsing.load_population
+    :param workers: number of processes to use
+    :param years_shift: how many years later than data about schools the data
+        about population is
+    :return:
+        - dataframe with how many students are there for each age
+        - how much data was dropped
+    """
+    store = population_store.from_population(population)
+    return students_per_age_from_store(schools, store, workers, years_shift)
+
+
+def students_per_age_from_store(schools: pd.DataFrame, store: population_store.PopulationStore,
+                                workers: int = 1,
+                                years_shift: int = POPULATION_YEAR - REFERENCE_YEAR
+                                ) -> (pd.DataFrame, int):
+    """
+    Calculate how much students are there in each gmina for each age, using
+    the store of population data. Drop gmina if unable to locate data about
+    population for this code.
+
+    Voivodeships are independent, so with more than one worker they are
+    calculated in a process pool. The partial results are merged in the order
+    of voivodeships, so they do not depend on the number of workers.
+
+    :param schools: dataframe with data about schools
+    :param store: store of population data
+    :param workers: number of processes to use
+    :param years_shift: how many years later than data about schools the data
+        about population is
     :return:
         - dataframe with how many students are there for each age
         - how much data was dropped
     """
-    school_ages = agerange_for_school()
-    per_age = pd.DataFrame(columns = list(range(3, 20)))
-    # Ages in population df are in form of '       2 ' or '       22'
-    current_ages = [str(age).ljust(2).rjust(9) for age in range(5, 22)]
-    students_dropped = 0
+    students = schools['Uczniowie, wychow., słuchacze'].groupby(
+        level=['Województwo', 'Kod gminy'], observed=True).sum().sort_index()
+
+    # Left join of all gminas from schools data with population data; gminas
+    # without population for some of the ages are dropped (anti-join)
+    ages = ages_in_population(years_shift)
+    population = store.per_age(students.index, ages)
+    population.columns = [age - years_shift for age in ages]
+    found = population.notna().all(axis=1)
+    dropped = students.loc[~found]
+    for (_, gmina), dropping in dropped.items():
+        print(f'No gmina with code {gmina_codes.format_codes(gmina)} in population data. '
+              f'Dropping {dropping} students...')
+    population = population.loc[found]
+
+    voivodeships = list(students.index.get_level_values('Województwo').unique())
+    schools_parts = [schools.loc[[sheetname]] for sheetname in voivodeships]
+    population_parts = [population.loc[sheetname] for sheetname in voivodeships]
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(students_per_age_in_voivodeship, schools_parts,
+                                        population_parts))
+    else:
+        results = list(map(students_per_age_in_voivodeship, schools_parts, population_parts))
+
+    return pd.concat(results), dropped.sum()
+
+
+def population_per_age(population: pd.DataFrame,
+                       years_shift: int = POPULATION_YEAR - REFERENCE_YEAR) -> pd.DataFrame:
+    """
+    Select population of the ages attending schools, one column for each age.
 
-    for sheetname in schools.index.get_level_values('Województwo').unique():
-        population = parsing.load_population_df(population_path, sheetname)
+    :param population: dataframe from parsing.load_population
+    :param years_shift: how many years later than data about schools the data
+        about population is
+    :return: dataframe with population of each age (columns) in each gmina
+        (index: voivodeship, code); NaN where the age is missing
+    """
+    current_ages = [age_label(age) for age in ages_in_population(years_shift)]
+
+    totals = population['Total']
+    totals = totals.loc[totals.index.get_level_values('Specification').isin(current_ages)]
+    population = totals.unstack('Specification').reindex(columns=current_ages)
 
-        for gmina in schools.loc[sheetname].index.get_level_values('Kod gminy').unique():
-            try:
-                population_gmina = population.loc[gmina].loc[current_ages]
-                per_age.loc[gmina] = per_age_in_gmina(
-                    population_gmina, schools, sheetname, gmina, school_ages)
-            except KeyError:
-                dropping = schools.loc[sheetname, gmina, :].sum()['Uczniowie, wychow., słuchacze']
-                students_dropped += dropping
-                print(f'No gmina with code {gmina} in population data. Dropping {dropping} '
-                      f'students...')
+    # Now we convert ages to ints and subtract the shift, to get ages in the
+    # year of data from schools
+    population.columns = [int(age) - years_shift for age in current_ages]
+    return population
 
-    return per_age, students_dropped
+
+def students_per_age_in_voivodeship(schools: pd.DataFrame,
+                                    population: pd.DataFrame) -> pd.DataFrame:
+    """
+    In selected voivodeship, calculate how much students are there in each
+    gmina for each age.
+
+    :param schools: part of schools dataframe corresponding to voivodeship
+    :param population: population of each age in gminas of the voivodeship, from
+        population_per_age
+    :return: dataframe with how many students are there for each age
+    """
+    return per_age_matrix(population, schools, agerange_for_school())
+
+
+def type_age_matrix(school_ages: dict, school_types: list, ages: list) -> np.ndarray:
+    """
+    Create a matrix telling which ages attend each type of school.
+
+    :param school_ages: a dictionary with age range for each type of school
+    :param school_types: types of school, rows of the matrix
+    :param ages: ages, columns of the matrix
+    :return: boolean matrix, school type x age
+    """
+    return np.array([[age in school_ages[school] for age in ages] for school in school_types],
+                    dtype=bool).reshape(len(school_types), len(ages))
+
+
+def per_age_matrix(population: pd.DataFrame, schools: pd.DataFrame,
+                   school_ages: dict) -> pd.DataFrame:
+    """
+    For all gminas at once, calculate how much students are there for each age.
+
+    Students of each type of school are split between the ages attending it
+    proportionally to the population of each age, and divided by the number of
+    all schools in gmina.
+
+    :param population: population of each age (columns) in each gmina (index)
+    :param schools: dataframe with data about schools
+    :param school_ages: a dictionary with age range for each type of school
+    :return: dataframe with how many students are there for each age, gmina x age
+    """
+    students = schools['Uczniowie, wychow., słuchacze'].droplevel('Województwo').unstack(
+        'Nazwa typu').reindex(population.index)
+    all_schools = schools['Liczba szkół'].groupby(level='Kod gminy').sum().reindex(
+        population.index)
+
+    # School type x age, gmina x age and gmina x school type matrices
+    membership = type_age_matrix(school_ages, list(students.columns), list(population.columns))
+    people = population.to_numpy(dtype=float)
+    eligible = people @ membership.T
+    present = students.notna().to_numpy()
+
+    # Gmina x school type x age; types are summed in the same order as they
+    # appear in each gmina, so the results do not depend on the layout
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shares = people[:, np.newaxis, :] / eligible[:, :, np.newaxis]
+        per_school = shares * students.to_numpy(dtype=float)[:, :, np.newaxis] / \
+            all_schools.to_numpy(dtype=float)[:, np.newaxis, np.newaxis]
+    per_school = np.where(membership[np.newaxis] & present[:, :, np.newaxis], per_school, 0.0)
+
+    return pd.DataFrame(per_school.sum(axis=1), index=population.index,
+                        columns=population.columns)
 
 
 def per_age_in_gmina(population_gmina: pd.DataFrame, schools: pd.DataFrame, sheetname: str,
-                     gmina: str, school_ages: dict) -> dict:
+                     gmina: int, school_ages: dict,
+                     years_shift: int = POPULATION_YEAR - REFERENCE_YEAR) -> dict:
     """
     In selected gmina, calculate how much students are there for each age.
 
     :param population_gmina: part of population dataframe corresponding to gmina
     :param schools: dataframe with data about schools
     :param sheetname: name of gmina's voivodeship, corresponding to sheetname
-    :param gmina: gmina code
+    :param gmina: gmina code, packed into an integer
     :param school_ages: a dictionary with age range for each type of school
+    :param years_shift: how many years later than data about schools the data
+        about population is
     :return: dict of how much students are there for each age
     """
-    # Now we convert ages to ints and subtract 2, since data from schools are
-    # from 2 years earlier
-    population_gmina.index = population_gmina.index.map(int) - 2
-
-    all_schools = schools.loc[sheetname, gmina, :].sum()['Liczba szkół']
-    students_per_age_school = {age: 0 for age in range(3, 20)}
+    # Now we convert ages to ints and subtract the shift, to get ages in the
+    # year of data from schools
+    population = population_gmina[['Total']].T.set_axis([gmina])
+    population.columns = population_gmina.index.map(int) - years_shift
 
-    for school in schools.loc[sheetname, gmina, :].index.get_level_values('Nazwa typu'):
-        all_eligible = population_gmina.loc[school_ages[school]].sum()['Total']
-        for age in school_ages[school]:
-            age_proportion = population_gmina.loc[age, 'Total'] / all_eligible
-            students_per_age_school[age] += age_proportion * schools.loc[(
-                sheetname, gmina, school), 'Uczniowie, wychow., słuchacze'] / all_schools
+    per_age = per_age_matrix(population, schools.loc[[sheetname]], school_ages)
+    return per_age.loc[gmina].to_dict()
 
-    return students_per_age_school
 
-
-def statistics_for_type(per_age: pd.DataFrame, gmina_type: str) -> pd.DataFrame:
+def statistics_for_type(per_age: pd.DataFrame, gmina_type: str,
+                        relative_accuracy: float = None) -> pd.DataFrame:
     """
     Calculate max, min, median, mean of the number of students per school for
     each year of birth in selected type of gmina.
 
     :param per_age: how many students are there for each year of birth in each gmina
     :param gmina_type: which type of gmina do we select
+    :param relative_accuracy: None for exact medians, or relative error of
+        medians read from quantile sketches (see src.quantiles)
     :return: dataframe with results
     """
-    mask = per_age['Typ gminy'] == gmina_type
-    per_age = per_age.drop(['Typ gminy'], axis=1)
-
-    stat_cols = {'Maks. uczniów na szkołę': per_age.loc[mask].max(),
-                 'Min. uczniów na szkołę': per_age.loc[mask].min(),
-                 'Mediana uczniów na szkołę': per_age.loc[mask].median(),
-                 'Średnia uczniów na szkołę': per_age.loc[mask].mean()}
+    # Rows and columns are selected at once, copying only the selected part
+    selected = per_age.loc[per_age['Typ gminy'] == gmina_type,
+                           per_age.columns.drop('Typ gminy')]
+    if relative_accuracy is None:
+        medians = pd.Series(quantiles.median(selected.to_numpy(dtype=float)),
+                            index=selected.columns)
+    else:
+        # One group for each year of birth
+        values = selected.rename_axis(columns='Rok urodzenia').stack().rename('value')
+        medians = quantiles.QuantileSketch.from_frame(
+            values.to_frame(), ['Rok urodzenia'], 'value',
+            relative_accuracy).median().reindex(selected.columns)
+
+    stat_cols = {'Maks. uczniów na szkołę': selected.max(),
+                 'Min. uczniów na szkołę': selected.min(),
+                 'Mediana uczniów na szkołę': medians,
+                 'Średnia uczniów na szkołę': selected.mean()}
     stats = pd.DataFrame(stat_cols)
 
-    stats.loc[:, 'Rok urodzenia'] = stats.index
-    stats.loc[:, 'Typ gminy'] = gmina_type
+    stats['Rok urodzenia'] = stats.index
+    stats['Typ gminy'] = gmina_type
     return stats.set_index(['Typ gminy', 'Rok urodzenia'])
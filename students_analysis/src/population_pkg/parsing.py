@@ -4,24 +4,30 @@ Provide methods used to load and properly parse official data about population.
 
 import pandas as pd
 import os.path
+from src import gmina_codes
+
+POPULATION_FILE = 'tabela12.xls'
 
 
 def fix_index_and_cols(population: pd.DataFrame) -> pd.DataFrame:
     """
     Name columns, fix values in those columns so that they can be used as index,
-    then set them as MultiIndex.
+    then set them as MultiIndex. Codes are converted to integers (see
+    gmina_codes).
 
     :param population: dataframe with data about population
     :return: dataframe, updated
     """
     population.columns = ['Specification', 'Code', 'Total']
-    for i in population.index:
-        if population.loc[i, 'Code'] != '       ':
-            last_code = population.loc[i, 'Code']
-        else:
-            population.loc[i, 'Code'] = last_code
-    # Unify codes, since '023' can only be str, but 123 is naturally int
-    population.loc[:, 'Code'] = population.loc[:, 'Code'].map(str)
+    # Rows with blank code continue the last gmina above them. Only blank codes
+    # are filled, so cells that are genuinely empty stay untouched.
+    has_code = population['Code'] != '       '
+    population['Code'] = population.loc[has_code, 'Code'].reindex(population.index,
+                                                                  method='ffill')
+    # Unify codes, since '023' can only be str, but 123 is naturally int. Rows
+    # without a code can't be connected to any gmina
+    population['Code'] = gmina_codes.parse(population['Code'])
+    population = population.dropna(subset=['Code']).astype({'Code': 'int64'})
     return population.set_index(['Code', 'Specification'])
 
 
@@ -36,6 +42,38 @@ def load_population_df(population_path: str, sheetname: str) -> pd.DataFrame:
     # Fix incorrect sheetname in tabela12.xls
     if sheetname == 'Śląskie':
         sheetname = 'Śląske'
-    population = pd.read_excel(os.path.join(population_path, 'tabela12.xls'),
+    population = pd.read_excel(os.path.join(population_path, POPULATION_FILE),
                                sheet_name=sheetname, skiprows=8, header=None, usecols='A:C')
     return fix_index_and_cols(population)
+
+
+def parse_population_sheets(sheets: dict) -> pd.DataFrame:
+    """
+    Parse all the sheets (voivodeships) read from the file.
+
+    :param sheets: dict of sheetname -> dataframe with columns A:C, without headers
+    :return: parsed dataframe, indexed by voivodeship, code and specification
+    """
+    # Fix incorrect sheetname in tabela12.xls
+    if 'Śląske' in sheets:
+        sheets['Śląskie'] = sheets.pop('Śląske')
+
+    population = pd.concat({sheetname: fix_index_and_cols(sheet)
+                            for sheetname, sheet in sheets.items()})
+    population.index.names = ['Województwo', 'Code', 'Specification']
+    return population
+
+
+def load_population(population_path: str) -> pd.DataFrame:
+    """
+    Read all the sheets (voivodeships) from the file at once and parse them.
+
+    The workbook is opened and decoded only once, instead of once per
+    voivodeship.
+
+    :param population_path: where population data is located
+    :return: loaded dataframe, indexed by voivodeship, code and specification
+    """
+    sheets = pd.read_excel(os.path.join(population_path, POPULATION_FILE),
+                           sheet_name=None, skiprows=8, header=None, usecols='A:C')
+    return parse_population_sheets(sheets)
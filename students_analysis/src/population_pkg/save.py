@@ -3,33 +3,40 @@ Provide methods used to save per age results.
 """
 
 import pandas as pd
+from src import gmina_codes, output
 from src.population_pkg import calculate
 
 
-def add_gmina_types(per_age: pd.DataFrame):
+def add_gmina_types(per_age: pd.DataFrame) -> pd.DataFrame:
     """
     Convert gmina types from numbers back to strings.
 
     :param per_age: how many students are there for each age in each gmina
+    :return: new dataframe, with a column of gmina types
     """
-    gminatypes_converter = {'1': 'M', '2': 'Gm', '3': 'M-Gm'}
+    gmina_types = gmina_codes.decode(per_age.index)[3]
+    # The new dataframe shares the columns of per_age and has its own new column
+    per_age = per_age.copy(deep=False)
+    per_age['Typ gminy'] = pd.Index(gmina_types).map(gmina_codes.GMINA_TYPE_NAMES)
+    return per_age
 
-    per_age.loc[:, 'Typ gminy'] = per_age.index.str[-1].map(gminatypes_converter)
 
-
-def save_per_age_statistics(per_age: pd.DataFrame, outfile: str):
+def save_per_age_statistics(per_age: pd.DataFrame, outfile: str,
+                            relative_accuracy: float = None):
     """
     Run calculations (min, max, mean, median of students per school for each year of birth
     in each type of gmina) and save the results to the file.
 
     :param per_age: how many students are there for each year of birth in each gmina
     :param outfile: where to save results
+    :param relative_accuracy: None for exact medians, or relative error of
+        approximate medians
     """
-    add_gmina_types(per_age)
+    per_age = add_gmina_types(per_age)
 
-    df1 = calculate.statistics_for_type(per_age, 'Gm')
-    df2 = calculate.statistics_for_type(per_age, 'M')
-    df3 = calculate.statistics_for_type(per_age, 'M-Gm')
+    df1 = calculate.statistics_for_type(per_age, 'Gm', relative_accuracy)
+    df2 = calculate.statistics_for_type(per_age, 'M', relative_accuracy)
+    df3 = calculate.statistics_for_type(per_age, 'M-Gm', relative_accuracy)
 
     print(f'Printing out to {outfile}...\n')
-    df1.append([df2, df3]).to_excel(outfile)
+    output.write_frame(pd.concat([df1, df2, df3]), outfile)
@@ -0,0 +1,212 @@
+"""
+Provide a store of the national population table: population of each age in
+each gmina, as a dense gmina x age array with gminas sorted by their codes.
+
+Once written to a directory of .npy files, the store is opened memory-mapped,
+so repeated runs and worker processes read it without parsing or copying,
+and find the ages of any gmina by a binary search of its code.
+"""
+
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from src import cache, gmina_codes
+from src.population_pkg import ages, parsing
+from src.population_pkg.ages import age_label
+
+# Change when the layout of stored files changes; changes of the code parsing
+# the population data are found by cache.code_version
+STORE_VERSION = 2
+# Code whose changes change the store
+STORE_SOURCES = (os.path.abspath(__file__), parsing.__file__, ages.__file__, gmina_codes.__file__)
+ARRAYS = ('codes', 'voivodeships', 'ages', 'counts')
+
+
+class PopulationStore:
+    """
+    Population of each age in each gmina.
+
+    Arrays, one row for each gmina, sorted by codes:
+        - codes: gmina codes, packed into integers (see gmina_codes)
+        - voivodeships: index of the voivodeship of the gmina in voivodeship_names
+        - counts: population of each of the ages, NaN where it is missing
+    """
+
+    def __init__(self, codes: np.ndarray, voivodeships: np.ndarray, ages: np.ndarray,
+                 counts: np.ndarray, voivodeship_names: list, directory: str = None):
+        self.codes = codes
+        self.voivodeships = voivodeships
+        self.ages = ages
+        self.counts = counts
+        self.voivodeship_names = voivodeship_names
+        self.directory = directory
+
+    def __reduce__(self):
+        # Stores on disk are sent to worker processes as their directory only
+        if self.directory is not None:
+            return open_store, (self.directory,)
+        return PopulationStore, (self.codes, self.voivodeships, self.ages, self.counts,
+                                 self.voivodeship_names)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def positions(self, codes: np.ndarray) -> np.ndarray:
+        """
+        :param codes: gmina codes, packed into integers
+        :return: row of each of the gminas, -1 for gminas not in the store
+        """
+        codes = np.asarray(codes, dtype=self.codes.dtype)
+        positions = np.searchsorted(self.codes, codes)
+        inside = positions < len(self.codes)
+        found = inside & (self.codes[np.where(inside, positions, 0)] == codes)
+        return np.where(found, positions, -1)
+
+    def lookup(self, code: int) -> pd.Series:
+        """
+        :param code: gmina code, packed into an integer
+        :return: population of each age in the gmina, read without copying
+        """
+        position = self.positions([code])[0]
+        if position < 0:
+            raise KeyError(code)
+        return pd.Series(self.counts[position], index=self.ages, copy=False)
+
+    def per_age(self, index: pd.MultiIndex, ages: list) -> pd.DataFrame:
+        """
+        Select population of the ages in the gminas.
+
+        :param index: voivodeship and code of each gmina
+        :param ages: ages to select
+        :return: dataframe with population of each age (columns) in each gmina of
+            the index; NaN where the gmina (in this voivodeship) or the age is missing
+        """
+        positions = self.positions(index.get_level_values(1))
+        found = positions >= 0
+        names = np.array(self.voivodeship_names, dtype=object)[
+            self.voivodeships[np.where(found, positions, 0)]]
+        found &= names == index.get_level_values(0).to_numpy(dtype=object)
+
+        age_positions = np.searchsorted(self.ages, ages)
+        age_found = (age_positions < len(self.ages)) & \
+            (self.ages[np.minimum(age_positions, len(self.ages) - 1)] == ages)
+
+        rows = self.counts[np.where(found, positions, 0)]
+        values = rows[:, np.where(age_found, age_positions, 0)]
+        values[~found] = np.nan
+        values[:, ~age_found] = np.nan
+        return pd.DataFrame(values, index=index, columns=list(ages))
+
+
+def from_population(population: pd.DataFrame) -> PopulationStore:
+    """
+    Lay out the population table as a dense gmina x age array.
+
+    :param population: dataframe from parsing.load_population
+    :return: store kept in memory
+    """
+    totals = population['Total']
+    labels = totals.index.get_level_values('Specification')
+
+    # Only rows with single years of age, written as in age_label
+    label_ages = {}
+    for label in labels.unique():
+        if isinstance(label, str) and label.strip().isdigit() and \
+                label == age_label(int(label.strip())):
+            label_ages[label] = int(label.strip())
+    totals = totals.loc[labels.isin(list(label_ages))]
+
+    gminas = totals.index.droplevel('Specification')
+    codes = gminas.get_level_values('Code').to_numpy(dtype=np.int64)
+    unique_codes, first = np.unique(codes, return_index=True)
+    voivodeship_names = sorted(gminas.get_level_values('Województwo').unique())
+    voivodeships = pd.Categorical(gminas.get_level_values('Województwo')[first],
+                                  categories=voivodeship_names).codes.astype(np.int8)
+
+    row_ages = totals.index.get_level_values('Specification').map(label_ages).to_numpy()
+    ages = np.unique(row_ages)
+    counts = np.full((len(unique_codes), len(ages)), np.nan)
+    counts[np.searchsorted(unique_codes, codes), np.searchsorted(ages, row_ages)] = \
+        totals.to_numpy(dtype=float)
+
+    return PopulationStore(unique_codes, voivodeships, ages, counts, voivodeship_names)
+
+
+def write_store(store: PopulationStore, directory: str):
+    """
+    Save the store as .npy files in the directory.
+
+    :param store: store to save
+    :param directory: where to save the store; it should not exist yet
+    """
+    # Written to a temporary directory first, so that the store is never seen
+    # half written
+    partial = f'{directory}.partial-{os.getpid()}'
+    os.makedirs(partial)
+    for name in ARRAYS:
+        np.save(os.path.join(partial, f'{name}.npy'), getattr(store, name))
+    with open(os.path.join(partial, 'meta.json'), 'w', encoding='utf-8') as file:
+        json.dump({'version': STORE_VERSION, 'voivodeship_names': store.voivodeship_names},
+                  file, ensure_ascii=False)
+    try:
+        os.rename(partial, directory)
+    except OSError:
+        # Already written by another process
+        shutil.rmtree(partial)
+
+
+def open_store(directory: str) -> PopulationStore:
+    """
+    Open the store saved in the directory, memory-mapped.
+
+    :param directory: where the store was saved
+    :return: opened store
+    :raise ValueError: if the store was saved by another version of the program
+    """
+    with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as file:
+        meta = json.load(file)
+    if meta.get('version') != STORE_VERSION:
+        raise ValueError(f'Store in {directory} has version {meta.get("version")}, '
+                         f'not {STORE_VERSION}.')
+    arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+              for name in ARRAYS}
+    return PopulationStore(**arrays, voivodeship_names=meta['voivodeship_names'],
+                           directory=directory)
+
+
+def load_store(cache_dir: str, population_path: str) -> PopulationStore:
+    """
+    Open the store of the population data in the directory, writing it to the
+    cache first if the data changed since it was last written.
+
+    :param cache_dir: directory with cached data, or None to parse the data to
+        a store kept in memory
+    :param population_path: where population data is located
+    :return: store of the population data
+    """
+    population_file = os.path.join(population_path, parsing.POPULATION_FILE)
+    if cache_dir is None:
+        return from_population(parsing.load_population(population_path))
+
+    name = f'{cache.source_name(population_file)}.store'
+    key = f'v{STORE_VERSION}.{cache.code_version(*STORE_SOURCES)[:16]}.' \
+          f'{cache.fingerprint(population_file)}'
+    directory = os.path.join(cache_dir, f'{name}-{key}')
+    if os.path.isdir(directory):
+        try:
+            store = open_store(directory)
+        except (OSError, ValueError):
+            # Written by another version, or not completely; written again below
+            pass
+        else:
+            print(f'Using stored population data for {population_file}...')
+            return store
+
+    os.makedirs(cache_dir, exist_ok=True)
+    for entry in os.listdir(cache_dir):
+        if entry.startswith(f'{name}-'):
+            shutil.rmtree(os.path.join(cache_dir, entry), ignore_errors=True)
+    write_store(from_population(parsing.load_population(population_path)), directory)
+    return open_store(directory)
@@ -0,0 +1,170 @@
+"""
+Provide lightweight instrumentation of the pipeline stages: wall time, peak
+memory and number of rows in and out of each stage.
+
+With memory tracing, memory of a stage is its peak of memory allocated by
+Python and NumPy (traced by tracemalloc), above what was allocated when it
+started; tracing slows Python code down several times, so it is optional. Peak
+resident memory of the whole process, and of the largest worker process, is
+reported for the whole run.
+
+Disabled by default, in which case a stage is just a plain function call.
+"""
+
+import cProfile
+import json
+import sys
+import time
+import tracemalloc
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+_enabled = False
+_trace_memory = False
+_profiler = None
+_stages = []
+# Peaks of memory in stages running inside other stages, one for each open stage
+_open_peaks = []
+
+
+def enable(use_cprofile: bool = False, trace_memory: bool = False):
+    """
+    Start recording the stages.
+
+    :param use_cprofile: whether to also run cProfile over the whole pipeline
+    :param trace_memory: whether to record peak memory allocated by each stage
+    """
+    global _enabled, _trace_memory, _profiler
+    _enabled = True
+    _trace_memory = trace_memory
+    _stages.clear()
+    if trace_memory:
+        tracemalloc.start()
+    if use_cprofile:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def is_enabled() -> bool:
+    """
+    :return: whether the stages are recorded
+    """
+    return _enabled
+
+
+def disable():
+    """
+    Stop recording the stages.
+    """
+    global _enabled, _trace_memory
+    _enabled = False
+    if _trace_memory:
+        tracemalloc.stop()
+    _trace_memory = False
+
+
+def count_rows(values) -> int:
+    """
+    Find the first dataframe (or series) among the values, also inside tuples.
+
+    :param values: values passed to or returned from a stage
+    :return: its number of rows, or None if there is no dataframe
+    """
+    for value in values:
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            return len(value)
+        if isinstance(value, tuple):
+            rows = count_rows(value)
+            if rows is not None:
+                return rows
+    return None
+
+
+def peak_rss_mb(who: int = None) -> float:
+    """
+    :param who: resource.RUSAGE_SELF for this process (default), or
+        resource.RUSAGE_CHILDREN for the largest of its finished worker processes
+    :return: peak resident memory so far, in MB, or None if unknown
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF if who is None else who).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def stage(name: str, func, *args, **kwargs):
+    """
+    Run func(*args, **kwargs) as a pipeline stage and record it if enabled.
+
+    Stages that modify a dataframe in place (and return something else) are
+    counted as having the same number of rows on output as on input.
+
+    :param name: name of the stage in the report
+    :param func: function performing the stage
+    :return: whatever func returns
+    """
+    if not _enabled:
+        return func(*args, **kwargs)
+
+    rows_in = count_rows(args)
+    memory_at_start = peak = None
+    if _trace_memory:
+        memory_at_start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        _open_peaks.append(0)
+    start = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - start
+        if _trace_memory:
+            # Stages inside this one reset the peak, so theirs are counted too
+            _, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, _open_peaks.pop())
+            if _open_peaks:
+                _open_peaks[-1] = max(_open_peaks[-1], peak)
+    rows_out = count_rows((result,))
+
+    _stages.append({'stage': name, 'seconds': round(elapsed, 6),
+                    'peak_allocated_mb': None if peak is None else
+                    round((peak - memory_at_start) / 2 ** 20, 3),
+                    'rows_in': rows_in, 'rows_out': rows_in if rows_out is None else rows_out})
+    return result
+
+
+def report() -> dict:
+    """
+    :return: recorded stages, with total time and peak resident memory of the
+        process and of its largest worker process
+    """
+    return {'stages': list(_stages),
+            'total_seconds': round(sum(entry['seconds'] for entry in _stages), 6),
+            'peak_rss_mb': peak_rss_mb(),
+            'workers_peak_rss_mb': None if resource is None else
+            peak_rss_mb(resource.RUSAGE_CHILDREN)}
+
+
+def save_report(outfile: str, cprofile_outfile: str = None):
+    """
+    Save the report as JSON and, if cProfile was running, dump its statistics.
+
+    :param outfile: where to save the report
+    :param cprofile_outfile: where to dump cProfile statistics
+    """
+    global _profiler
+    with open(outfile, 'w', encoding='utf-8') as file:
+        json.dump(report(), file, ensure_ascii=False, indent=2)
+    print(f'Profiling report saved to {outfile}.')
+
+    if _profiler is not None:
+        _profiler.disable()
+        if cprofile_outfile is not None:
+            _profiler.dump_stats(cprofile_outfile)
+            print(f'cProfile statistics saved to {cprofile_outfile}.')
+        _profiler = None
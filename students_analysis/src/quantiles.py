@@ -0,0 +1,149 @@
+"""
+Compute medians and other quantiles of values, for columns or groups of rows.
+
+Exact medians of columns are found by a partial sort of each column
+(np.partition), and equal the medians from pandas; exact medians of groups of
+rows are left to pandas, which finds them by a partial sort of each group. For
+data too large to keep whole in memory, a QuantileSketch keeps a histogram of
+each group on logarithmic buckets instead of the values: sketches of chunks of
+data, or of parts calculated by worker processes, are merged into a sketch of
+all the data, and quantiles read from it are within a bounded relative error
+of the exact ones.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Default relative error of quantiles read from sketches
+RELATIVE_ACCURACY = 0.01
+# Bucket of zeros, below the buckets of all positive values
+ZERO_BUCKET = np.iinfo(np.int64).min
+BUCKET = 'bucket'
+
+
+def median(values: np.ndarray) -> np.ndarray:
+    """
+    Exact median of each column, by partial sort. Missing values are skipped,
+    as in pandas.
+
+    :param values: 2d array, rows x columns
+    :return: median of each column, NaN for columns with no values
+    """
+    values = np.asarray(values, dtype=float)
+    medians = np.full(values.shape[1], np.nan)
+    for column in range(values.shape[1]):
+        present = values[:, column]
+        present = present[~np.isnan(present)]
+        if len(present) > 0:
+            middle = [(len(present) - 1) // 2, len(present) // 2]
+            partitioned = np.partition(present, middle)
+            medians[column] = (partitioned[middle[0]] + partitioned[middle[1]]) / 2
+    return medians
+
+
+class QuantileSketch:
+    """
+    Histogram of non-negative values in each group, on logarithmic buckets.
+
+    Bucket i holds values in (gamma^(i - 1), gamma^i], where
+    gamma = (1 + a) / (1 - a) for relative accuracy a, and zeros have a bucket
+    of their own. Every value in a bucket is within relative error a of the
+    value the bucket stands for, so quantiles read from the sketch are too.
+    The number of buckets grows with the logarithm of the range of values, not
+    with the number of values. Sketches with the same accuracy are merged by
+    adding the counts of their buckets.
+    """
+
+    def __init__(self, counts: pd.Series, relative_accuracy: float = RELATIVE_ACCURACY):
+        """
+        :param counts: number of values in each bucket (last level of the index)
+            of each group (other levels of the index)
+        :param relative_accuracy: relative error of quantiles, between 0 and 1
+        """
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(f'Relative accuracy must be between 0 and 1, not '
+                             f'{relative_accuracy}.')
+        self.counts = counts
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, by: list, column: str,
+                   relative_accuracy: float = RELATIVE_ACCURACY) -> 'QuantileSketch':
+        """
+        :param frame: dataframe with the values
+        :param by: columns (or index levels) identifying a group
+        :param column: column with the values, non-negative; missing values are skipped
+        :param relative_accuracy: relative error of quantiles, between 0 and 1
+        :return: sketch of the values in each group
+        """
+        sketch = cls(pd.Series(dtype=np.int64), relative_accuracy)
+        present = frame[column].notna().to_numpy()
+        frame = frame.take(np.flatnonzero(present))
+        buckets = pd.Series(sketch.bucket_of(frame[column].to_numpy(dtype=float)),
+                            index=frame.index, name=BUCKET)
+        sketch.counts = frame.groupby(by + [buckets], observed=True).size()
+        return sketch
+
+    def bucket_of(self, values: np.ndarray) -> np.ndarray:
+        """
+        :param values: non-negative values
+        :return: bucket of each value
+        """
+        if (values < 0).any():
+            raise ValueError('Quantile sketches only hold non-negative values.')
+        positive = values > 0
+        with np.errstate(divide='ignore'):
+            buckets = np.ceil(np.log(np.where(positive, values, 1)) / np.log(self.gamma))
+        return np.where(positive, buckets.astype(np.int64), ZERO_BUCKET)
+
+    def value_of(self, buckets: np.ndarray) -> np.ndarray:
+        """
+        :param buckets: buckets of the sketch
+        :return: value each bucket stands for
+        """
+        zero = buckets == ZERO_BUCKET
+        return np.where(zero, 0.0, 2 * self.gamma ** np.where(zero, 0, buckets).astype(float)
+                        / (self.gamma + 1))
+
+    def merge(self, other: 'QuantileSketch') -> 'QuantileSketch':
+        """
+        :param other: sketch of other values, with the same relative accuracy
+        :return: sketch of the values of both sketches
+        """
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError(f'Cannot merge sketches with relative accuracy '
+                             f'{self.relative_accuracy} and {other.relative_accuracy}.')
+        counts = pd.concat([self.counts, other.counts])
+        return QuantileSketch(counts.groupby(level=list(range(counts.index.nlevels)),
+                                             observed=True).sum(), self.relative_accuracy)
+
+    def quantile(self, q: float) -> pd.Series:
+        """
+        Quantile of the values in each group, interpolated linearly between the
+        two nearest values as in pandas.
+
+        :param q: which quantile, between 0 and 1
+        :return: quantile in each group (index)
+        """
+        counts = self.counts.loc[self.counts > 0].sort_index()
+        groups = counts.index.droplevel(-1)
+        starts = np.flatnonzero(~groups.duplicated())
+        cumulative = np.cumsum(counts.to_numpy())
+        before = np.concatenate([[0], cumulative])[starts]
+        totals = np.append(before[1:], cumulative[-1:]) - before
+        buckets = counts.index.get_level_values(-1).to_numpy()
+
+        def value_at(ranks):
+            return self.value_of(buckets[np.searchsorted(cumulative, before + ranks,
+                                                         side='right')])
+
+        rank = q * (totals - 1)
+        lower, upper = value_at(np.floor(rank)), value_at(np.ceil(rank))
+        return pd.Series(lower + (upper - lower) * (rank - np.floor(rank)), index=groups[starts])
+
+    def median(self) -> pd.Series:
+        """
+        :return: median of the values in each group (index)
+        """
+        return self.quantile(0.5)
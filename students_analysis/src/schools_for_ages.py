@@ -3,62 +3,99 @@ Modify schools df from per teacher analysis for use in per age analysis.
 """
 
 import pandas as pd
+from src import gmina_codes
+from src.schools_pkg.schema import map_categories
+
+
+# Types of school that typically have the exactly same age range are merged;
+# types missing here have unclear age range
+SIMPLIFIED_TYPES = {
+    **dict.fromkeys(['Przedszkole', 'Punkt przedszkolny', 'Zespół wychowania przedszkolnego'],
+                    'Przedszkole'),
+    **dict.fromkeys(['Szkoła podstawowa', 'Ogólnokształcąca szkoła muzyczna I stopnia'],
+                    'Szkoła podstawowa'),
+    **dict.fromkeys(['Branżowa szkoła I stopnia', 'Szkoła specjalna przysposabiająca do pracy'],
+                    'Zawodówka'),
+    **dict.fromkeys(['Czteroletnie liceum plastyczne',
+                     'Ogólnokształcąca szkoła muzyczna II stopnia', 'Liceum ogólnokształcące'],
+                    'Liceum ogólnokształcące'),
+    **{school: school for school in ['Gimnazjum', 'Technikum',
+                                     'Sześcioletnia ogólnokształcąca szkoła sztuk pięknych',
+                                     'Dziewięcioletnia ogólnokształcąca szkoła baletowa']}}
+# Columns of schools df from per_teacher_analysis used for per age statistics
+PER_AGE_COLS = ['woj', 'pow', 'gm', 'Województwo', 'Typ gminy', 'Nazwa typu',
+                'Uczniowie, wychow., słuchacze', 'w tym w oddziałach przedszk.']
+
+
+def normalize_schools(schools: pd.DataFrame, report: bool = True) -> (pd.DataFrame, int):
+    """
+    Simplify school types, generate gmina codes and normalize voivodeship names
+    in one stage, with the same results as simplify_school_types,
+    update_with_gmina_codes and update_voivodeship_names. Strings are handled
+    once for each distinct value of a column, not for each school.
+
+    The input is not modified: the result has only the columns needed for per
+    age statistics, with new arrays for the changed and added ones.
+
+    :param schools: pd.DataFrame from per_teacher_analysis
+    :param report: whether to print how much data was dropped
+    :return:
+        - new dataframe
+        - how much data was dropped
+    """
+    # Columns are replaced, never written into, so they can be shared with the input
+    normalized = pd.DataFrame({column: schools[column] for column in PER_AGE_COLS}, copy=False)
+    dropped_now = simplify_school_types(normalized, report)
+    update_with_gmina_codes(normalized)
+    update_voivodeship_names(normalized)
+    return normalized, dropped_now
 
 
-def simplify_school_types(schools: pd.DataFrame) -> int:
+def simplify_school_types(schools: pd.DataFrame, report: bool = True) -> int:
     """
     Simplify school types that typically have the exactly same range. If some
     type of school has unclear age range, drop it.
 
-    :param schools: pd.DataFrame from per_teacher_analysis
+    :param schools: pd.DataFrame from per_teacher_analysis, edited
+    :param report: whether to print how much data was dropped
     :return: how much data was dropped
     """
-    types_simplified = {}
-
-    for przedszkole in ['Przedszkole', 'Punkt przedszkolny', 'Zespół wychowania przedszkolnego']:
-        types_simplified[przedszkole] = 'Przedszkole'
-    for podstawowka in ['Szkoła podstawowa', 'Ogólnokształcąca szkoła muzyczna I stopnia']:
-        types_simplified[podstawowka] = 'Szkoła podstawowa'
-    for zawodowka in ['Branżowa szkoła I stopnia', 'Szkoła specjalna przysposabiająca do pracy']:
-        types_simplified[zawodowka] = 'Zawodówka'
-    for liceum in ['Czteroletnie liceum plastyczne', 'Ogólnokształcąca szkoła muzyczna II stopnia',
-                   'Liceum ogólnokształcące']:
-        types_simplified[liceum] = 'Liceum ogólnokształcące'
-    for school in ['Gimnazjum', 'Technikum', 'Sześcioletnia ogólnokształcąca szkoła sztuk pięknych',
-                   'Dziewięcioletnia ogólnokształcąca szkoła baletowa']:
-        types_simplified[school] = school
-
-    mask = schools['Nazwa typu'].isin(types_simplified.keys())
-
-    dropped_now = schools.loc[~mask, "Uczniowie, wychow., słuchacze"].sum()
-    print(f'{dropped_now} students are enrolled in {(~mask).sum()} schools with unclear age range. '
-          f'Dropping...')
-
-    schools.loc[:, 'Nazwa typu'] = schools['Nazwa typu'].map(types_simplified)
-    schools = schools.loc[mask]
+    school_types = map_categories(schools['Nazwa typu'], SIMPLIFIED_TYPES)
+    unclear = school_types.isna()
+
+    dropped_now = schools.loc[unclear, "Uczniowie, wychow., słuchacze"].sum()
+    if report:
+        print_unclear_report(dropped_now, unclear.sum())
+
+    # Schools with unclear age range are left without type, and so are left out
+    # when grouping by it
+    schools['Nazwa typu'] = school_types
 
     return dropped_now
 
 
-def update_with_gmina_codes(schools: pd.DataFrame):
+def print_unclear_report(students: int, schools_count: int):
+    """
+    :param students: students in schools with unclear age range
+    :param schools_count: number of such schools
     """
-    For each gmina, generate its 7-digit code.
+    print(f'{students} students are enrolled in {schools_count} schools with unclear age '
+          f'range. Dropping...')
 
-    Each pair of the first 6 digits is taken directly from data, with leading
-    zero added if necessary. The last digit is converted to number from
-    gminatype.
 
-    :param schools: pd.DataFrame from per_teacher_analysis
+def update_with_gmina_codes(schools: pd.DataFrame):
     """
-    gminatypes_converter = {'M': '1', 'Gm': '2', 'M-Gm': '3'}
+    For each gmina, generate its code, packed into an integer.
 
-    # Convert 1,2,13 -> 01,02,13.
-    for column in ['woj', 'pow', 'gm']:
-        schools.loc[:, column] = schools[column].apply(str)
-        schools.loc[:, column] = schools[column].str.zfill(2)
+    The code is built from the woj, pow and gm columns and gminatype converted
+    to number. Unknown gminatype is converted to 0, which matches no gmina in
+    data about population.
 
-    schools.loc[:, 'Kod gminy'] = schools['woj'] + schools['pow'] + \
-        schools['gm'] + schools['Typ gminy'].map(gminatypes_converter)
+    :param schools: pd.DataFrame from per_teacher_analysis, edited
+    """
+    gmina_types = map_categories(schools['Typ gminy'], gmina_codes.GMINA_TYPES)
+    schools['Kod gminy'] = gmina_codes.encode(schools['woj'], schools['pow'], schools['gm'],
+                                              gmina_types.cat.add_categories(0).fillna(0))
 
 
 def update_voivodeship_names(schools: pd.DataFrame):
@@ -66,10 +103,10 @@ def update_voivodeship_names(schools: pd.DataFrame):
     Discard 'WOJ. ' and capitalize voivodeship names, for connection to
     population df.
 
-    :param schools: pd.DataFrame from per_teacher_analysis
+    :param schools: pd.DataFrame from per_teacher_analysis, edited
     """
-    schools.loc[:, 'Województwo'] = schools['Województwo'].str[5:]
-    schools.loc[:, 'Województwo'] = schools['Województwo'].str.capitalize()
+    schools['Województwo'] = map_categories(schools['Województwo'],
+                                            lambda name: name[5:].capitalize())
 
 
 def trim_schools_for_population(schools: pd.DataFrame) -> pd.DataFrame:
@@ -77,17 +114,16 @@ def trim_schools_for_population(schools: pd.DataFrame) -> pd.DataFrame:
     Drop all the info not needed to calculate per age statistics for each gmina.
     Count the schools.
 
-    :param schools: pd.DataFrame from per_teacher_analysis
-    :return: dataframe, edited
+    :param schools: pd.DataFrame from normalize_schools
+    :return: new dataframe
     """
-    schools.loc[:, 'Liczba szkół'] = 1
-    schools = schools.groupby(['Województwo', 'Kod gminy', 'Nazwa typu']).sum()
+    relevant_cols = ['Uczniowie, wychow., słuchacze', 'w tym w oddziałach przedszk.']
+    grouped = schools.groupby(['Województwo', 'Kod gminy', 'Nazwa typu'], observed=True)
+    trimmed = grouped[relevant_cols].sum()
+    trimmed['Liczba szkół'] = grouped.size()
 
-    irrelevant_cols = ['Złożoność', 'w tym dziewczęta', 'w tym w oddziałach innego typu',
-                       'Oddziały', 'Regon jednostki sprawozdawczej', 'Nauczyciele',
-                       'Uczniów na etat nauczycielski']
-
-    return schools.drop(irrelevant_cols, axis=1)
+    # Older pandas does not sort observed categorical groups
+    return trimmed.sort_index()
 
 
 def reallocate_preschool(schools: pd.DataFrame) -> pd.DataFrame:
@@ -95,26 +131,25 @@ def reallocate_preschool(schools: pd.DataFrame) -> pd.DataFrame:
     Reallocate preschoolers from primary school to preschool if necessary, so
     they are counted in their own age range.
 
-    :param schools: pd.DataFrame from per_teacher_analysis
-    :return: dataframe, edited
+    :param schools: pd.DataFrame from trim_schools_for_population
+    :return: new dataframe
     """
     mask = schools['w tym w oddziałach przedszk.'] > 0
     assert schools.loc[mask].index.get_level_values('Nazwa typu').unique(
     ) == 'Szkoła podstawowa', 'Evidently not all extra preschoolers are enrolled in primary ' \
                               'school -- let the analyst know!'
 
-    for gmina in schools.loc[mask].index.get_level_values('Kod gminy'):
-        voivodeship = schools.loc[:, gmina, :].index.get_level_values('Województwo')[0]
-        extra_preschool = schools.loc[(voivodeship, gmina, 'Szkoła podstawowa'),
-                                      'w tym w oddziałach przedszk.'].sum()
-        schools.loc[(voivodeship, gmina, 'Szkoła podstawowa'),
-                    'Uczniowie, wychow., słuchacze'] -= extra_preschool
-        if (voivodeship, gmina, 'Przedszkole') in schools.index:
-            schools.loc[(voivodeship, gmina, 'Przedszkole'),
-                        'Uczniowie, wychow., słuchacze'] += extra_preschool
-        else:
-            schools.loc[(voivodeship, gmina, 'Przedszkole')] = [extra_preschool, 0, 0]
-            # Resort index after inserting new row
-            schools = schools.sort_index()
+    extra_preschool = schools.loc[mask, 'w tym w oddziałach przedszk.']
+    transfers = extra_preschool.rename(index={'Szkoła podstawowa': 'Przedszkole'},
+                                       level='Nazwa typu')
+
+    # Add all the missing preschool rows at once, then sort the index only once
+    missing = transfers.index.difference(schools.index)
+    schools = pd.concat([schools, pd.DataFrame(0, index=missing, columns=schools.columns)])
+    schools = schools.sort_index()
+
+    schools['Uczniowie, wychow., słuchacze'] += \
+        transfers.reindex(schools.index, fill_value=0) - \
+        extra_preschool.reindex(schools.index, fill_value=0)
 
     return schools.drop(['w tym w oddziałach przedszk.'], axis=1)
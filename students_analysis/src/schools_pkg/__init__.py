@@ -2,6 +2,16 @@
 Handle official data about schools for per teacher and per age statistics.
 """
 
-import src.schools_pkg.calculate
-import src.schools_pkg.parsing
-import src.schools_pkg.save
+import importlib
+
+SUBMODULES = ('calculate', 'parsing', 'save', 'schema')
+
+
+def __getattr__(name: str):
+    if name in SUBMODULES:
+        return importlib.import_module(f'{__name__}.{name}')
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(list(globals()) + list(SUBMODULES))
@@ -3,44 +3,113 @@ Provide methods used to calculate max, min, median, mean of the number of
 students per teacher in gmina for different types of grouping.
 """
 
+from functools import reduce
 import pandas as pd
+from src import parallel
+from src.quantiles import QuantileSketch
 
+RATIO = 'Uczniów na etat nauczycielski'
+# Aggregations of each group, which are merged by applying them again
+AGGREGATIONS = {'Maks. uczniów na etat': (RATIO, 'max'), 'Min. uczniów na etat': (RATIO, 'min'),
+                'sum_students': ('Uczniowie, wychow., słuchacze', 'sum'),
+                'sum_teachers': ('Nauczyciele', 'sum')}
 
-def basic_statistics(group: pd.DataFrame) -> pd.DataFrame:
-    """
-    For provided group, calculate max, min, median, mean of the number of
-    students per teacher in gmina.
 
-    :param group: group of rows in pd.DataFrame
-    :return: group, with new columns appended
+def group_schools_with_statistics(schools: pd.DataFrame, groupby_cols: list,
+                                  relative_accuracy: float = None, workers: int = 1,
+                                  backend: str = parallel.DEFAULT_BACKEND) -> pd.DataFrame:
     """
-    sum_teachers = group['Nauczyciele'].sum()
-    sum_students = group['Uczniowie, wychow., słuchacze'].sum()
+    Calculate basic statistics (max, min, median, mean of the number of
+    students per teacher) for provided type of grouping.
 
-    maximum = group['Uczniów na etat nauczycielski'].max()
-    minimum = group['Uczniów na etat nauczycielski'].min()
-    median = group['Uczniów na etat nauczycielski'].median()
+    With more workers, groups are split between processes (see src.parallel);
+    the results are the same bit for bit.
 
-    group['Maks. uczniów na etat'], group['Min. uczniów na etat'] = maximum, minimum
-    group['Mediana uczniów na etat'] = median
-    group['Średnia uczniów na etat'] = sum_students / sum_teachers
+    :param schools: pd.DataFrame with data about schools
+    :param groupby_cols: which columns identify a group
+    :param relative_accuracy: None for exact medians, or relative error of
+        medians read from quantile sketches (see src.quantiles)
+    :param workers: number of processes calculating the groups
+    :param backend: 'multiprocessing' or 'dask'
+    :return: dataframe with statistics for each group
+    """
+    if workers > 1:
+        # Only the columns used are sent to the workers
+        columns = groupby_cols + [RATIO, 'Uczniowie, wychow., słuchacze', 'Nauczyciele']
+        return parallel.apply_by_groups(group_schools_with_statistics, schools[columns],
+                                        groupby_cols, workers, backend, groupby_cols,
+                                        relative_accuracy)
 
-    return group
+    mask = schools['Nauczyciele'] > 0
+    selected = schools.loc[mask]
+    grouped = selected.groupby(groupby_cols, observed=True)
 
+    stats = grouped.agg(**AGGREGATIONS)
+    if relative_accuracy is None:
+        medians = grouped[RATIO].median()
+    else:
+        medians = QuantileSketch.from_frame(selected, groupby_cols, RATIO,
+                                            relative_accuracy).median().reindex(stats.index)
+    return finish_statistics(stats, medians)
 
-def group_schools_with_statistics(schools: pd.DataFrame, groupby_cols: list, irrelevant_cols:
-                                  list) -> pd.DataFrame:
+
+def partial_statistics(schools: pd.DataFrame, groupby_cols: list,
+                       relative_accuracy: float = None) -> tuple:
     """
-    Calculate basic statistics for provided type of grouping.
+    Calculate aggregates of a part of the schools, from which statistics of
+    all the schools are calculated by merge_statistics. Parts must not share
+    schools, but may share groups.
 
-    :param schools: pd.DataFrame with data about schools
+    :param schools: pd.DataFrame with data about a part of schools
     :param groupby_cols: which columns identify a group
-    :param irrelevant_cols: which columns are irrelevant and should be dropped
-    :return: dataframe, edited
+    :param relative_accuracy: None for exact medians, or relative error of
+        medians read from quantile sketches (see src.quantiles)
+    :return:
+        - dataframe with aggregates of each group
+        - number of students per teacher in each school, indexed by its group,
+          or with relative_accuracy their quantile sketch
     """
     mask = schools['Nauczyciele'] > 0
-    schools_grouped = schools.loc[mask].groupby(groupby_cols).apply(basic_statistics)
-    # All the values are the same in each row in group, so we just take the last one
-    schools_grouped = schools_grouped.groupby(groupby_cols).last()
+    selected = schools.loc[mask]
+    aggregates = selected.groupby(groupby_cols, observed=True).agg(**AGGREGATIONS)
+    if relative_accuracy is None:
+        ratios = selected.set_index(groupby_cols)[RATIO]
+    else:
+        ratios = QuantileSketch.from_frame(selected, groupby_cols, RATIO, relative_accuracy)
+    return aggregates, ratios
+
+
+def merge_statistics(partials: list) -> pd.DataFrame:
+    """
+    Calculate basic statistics (max, min, median, mean of the number of
+    students per teacher) of all the schools from aggregates of their parts.
+
+    :param partials: results of partial_statistics for each part, all with the
+        same grouping and relative accuracy
+    :return: dataframe with statistics for each group
+    """
+    aggregates = pd.concat([aggregates for aggregates, _ in partials])
+    levels = list(range(aggregates.index.nlevels))
+    stats = aggregates.groupby(level=levels, observed=True).agg(
+        {name: function for name, (_, function) in AGGREGATIONS.items()})
+
+    ratios = [ratios for _, ratios in partials]
+    if isinstance(ratios[0], QuantileSketch):
+        medians = reduce(QuantileSketch.merge, ratios).median()
+    else:
+        medians = pd.concat(ratios).groupby(level=levels, observed=True).median()
+    return finish_statistics(stats, medians.reindex(stats.index))
+
+
+def finish_statistics(stats: pd.DataFrame, medians: pd.Series) -> pd.DataFrame:
+    """
+    :param stats: aggregates of each group
+    :param medians: median number of students per teacher in each group, in
+        the same order
+    :return: dataframe with statistics for each group, sorted
+    """
+    stats.insert(2, 'Mediana uczniów na etat', medians.to_numpy())
+    stats['Średnia uczniów na etat'] = stats['sum_students'] / stats['sum_teachers']
 
-    return schools_grouped.drop(irrelevant_cols, axis=1)
+    # Older pandas does not sort observed categorical groups
+    return stats.drop(['sum_students', 'sum_teachers'], axis=1).sort_index()
@@ -1,28 +1,157 @@
 """
 Provide methods used to load and properly parse official data about schools.
+
+Functions returning a dataframe leave their input as it was, and the returned
+dataframe owns its data; functions returning nothing edit the dataframe they
+are given, which must be owned by the caller.
 """
 
+import operator
+import numpy as np
+import openpyxl
 import pandas as pd
+from src.schools_pkg import schema
+
+COLS_TO_USE = ['Lp.', 'woj', 'pow', 'gm', 'Województwo', 'Powiat', 'Gmina', 'Typ gminy',
+               'Miejscowość', 'Nazwa typu', 'Złożoność', 'Nazwa szkoły, placówki', 'Regon',
+               'Uczniowie, wychow., słuchacze', 'w tym dziewczęta',
+               'w tym w oddziałach przedszk.', 'w tym w oddziałach innego typu', 'Oddziały',
+               'Nauczyciele pełnozatrudnieni',
+               'Nauczyciele niepełnozatrudnieni (w etatach)', 'Regon jednostki sprawozdawczej']
+# Rows of the schools sheet read at once by stream_schools_df
+CHUNK_ROWS = 5000
 
 
 def load_schools_df(schools_path: str) -> pd.DataFrame:
     """
-    Load data about schools to a dataframe.
+    Load data about schools to a dataframe, with compact dtypes.
 
     :param schools_path: where data about schools is located
     :return: loaded dataframe
     """
-    cols_to_use = ['Lp.', 'woj', 'pow', 'gm', 'Województwo', 'Powiat', 'Gmina', 'Typ gminy',
-                   'Miejscowość', 'Nazwa typu', 'Złożoność', 'Nazwa szkoły, placówki', 'Regon',
-                   'Uczniowie, wychow., słuchacze', 'w tym dziewczęta',
-                   'w tym w oddziałach przedszk.', 'w tym w oddziałach innego typu', 'Oddziały',
-                   'Nauczyciele pełnozatrudnieni', 'Nauczyciele niepełnozatrudnieni (w etatach)',
-                   'Regon jednostki sprawozdawczej']
     # Row no. 1 is empty
     schools = pd.read_excel(schools_path, index_col=0, na_filter=False,
-                            usecols=cols_to_use, skiprows=[1])
-    assert (schools.columns == cols_to_use[1:]).all()
-    return schools
+                            usecols=COLS_TO_USE, skiprows=[1])
+    assert (schools.columns == COLS_TO_USE[1:]).all()
+    return schema.apply_schema(schools)
+
+
+def iter_schools_chunks(schools_path: str, chunk_rows: int):
+    """
+    Read the sheet with data about schools row by row, with a read-only
+    workbook, and yield chunks of rows with the needed columns.
+
+    :param schools_path: where data about schools is located
+    :param chunk_rows: number of rows in each chunk
+    """
+    workbook = openpyxl.load_workbook(schools_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, ())
+        missing = [column for column in COLS_TO_USE if column not in header]
+        if missing:
+            raise ValueError(f'Columns not found in {schools_path}: {missing}')
+        pick = operator.itemgetter(*[header.index(column) for column in COLS_TO_USE])
+        # Row no. 1 is empty
+        next(rows, None)
+
+        chunk = []
+        for row in rows:
+            # Rows may be shorter than the header, if their last cells are empty
+            if len(row) < len(header):
+                row = row + (None,) * (len(header) - len(row))
+            values = pick(row)
+            # Blank rows with only formatting are skipped, as by read_excel
+            if all(value is None or value == '' for value in values):
+                continue
+            chunk.append(values)
+            if len(chunk) == chunk_rows:
+                yield pd.DataFrame(chunk, columns=COLS_TO_USE)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=COLS_TO_USE)
+    finally:
+        workbook.close()
+
+
+def iter_clean_chunks(schools_path: str, chunk_rows: int = CHUNK_ROWS):
+    """
+    Read data about schools chunk by chunk, dropping schools with duplicate
+    REGONs (also between chunks) and delegatures from each chunk as soon as it
+    is read, and yield the chunks. Numeric columns get their compact dtypes;
+    categories are left to the caller, as they depend on all the chunks.
+
+    :param schools_path: where data about schools is located
+    :param chunk_rows: number of rows read at once
+    :return: generator of pairs:
+        - chunk, with REGON in a column
+        - how many students were dropped from it
+    """
+    students = 'Uczniowie, wychow., słuchacze'
+    numeric_dtypes = {column: dtype for column, dtype in schema.SCHOOLS_DTYPES.items()
+                      if dtype not in ('category', 'object')}
+    seen_regons = set()
+    duplicates_count = duplicates_students = delegatures_count = delegatures_students = 0
+
+    for chunk in iter_schools_chunks(schools_path, chunk_rows):
+        # Empty cells are read as empty strings, as with na_filter=False
+        chunk = schema.blanks_to_na(chunk.fillna('')).astype(numeric_dtypes)
+
+        # Schools without REGON are duplicates of each other, as in drop_duplicate_regon
+        regons = chunk['Regon'].to_numpy(dtype=np.int64, na_value=-1)
+        duplicates = np.fromiter((regon in seen_regons for regon in regons), bool, len(regons))
+        duplicates |= chunk['Regon'].duplicated().to_numpy()
+        seen_regons.update(regons[~duplicates])
+        duplicated_now = chunk.loc[duplicates, students].sum()
+        duplicates_count += duplicates.sum()
+        duplicates_students += duplicated_now
+
+        chunk = chunk.loc[~duplicates]
+        delegatures = chunk['Złożoność'] == 4
+        delegatures_now = chunk.loc[delegatures, students].sum()
+        delegatures_count += delegatures.sum()
+        delegatures_students += delegatures_now
+        yield chunk.loc[~delegatures], duplicated_now + delegatures_now
+
+    print(f'{duplicates_students} students from {duplicates_count} schools with duplicated REGON '
+          f'found. Dropping...')
+    print(f'{delegatures_students} students from {delegatures_count} delegatures found. '
+          f'Dropping...')
+
+
+def stream_schools_df(schools_path: str, chunk_rows: int = CHUNK_ROWS) -> (pd.DataFrame, int):
+    """
+    Load data about schools chunk by chunk, dropping schools with duplicate
+    REGONs and delegatures from each chunk as soon as it is read. Gives the
+    same data as load_schools_df followed by set_regon_as_index and
+    drop_delegatures, without keeping the whole sheet in memory.
+
+    :param schools_path: where data about schools is located
+    :param chunk_rows: number of rows read at once
+    :return:
+        - dataframe with REGON as index, with compact dtypes
+        - how many students were dropped
+    """
+    kept = []
+    students_dropped = 0
+    for chunk, dropped_now in iter_clean_chunks(schools_path, chunk_rows):
+        kept.append(chunk)
+        students_dropped += dropped_now
+
+    schools = pd.concat(kept).set_index('Regon').drop(columns='Lp.')
+    return schema.apply_schema(schools), students_dropped
+
+
+def select_rows(schools: pd.DataFrame, mask) -> pd.DataFrame:
+    """
+    Select rows as a new dataframe, which is not a view of the input, so that
+    it can be edited without warnings and without a defensive copy.
+
+    :param schools: dataframe with data about schools
+    :param mask: boolean mask of rows to keep
+    :return: new dataframe with the selected rows
+    """
+    return schools.take(np.flatnonzero(mask))
 
 
 def drop_duplicate_regon(schools: pd.DataFrame) -> pd.DataFrame:
@@ -30,12 +159,12 @@ def drop_duplicate_regon(schools: pd.DataFrame) -> pd.DataFrame:
     Drop schools with duplicate REGONs from the dataframe.
 
     :param schools: dataframe with data about schools
-    :return: dataframe, edited
+    :return: new dataframe
     """
     duplicates = schools.duplicated(['Regon'])
     print(f'{schools.loc[duplicates, "Uczniowie, wychow., słuchacze"].sum()} students from '
           f'{duplicates.sum()} schools with duplicated REGON found. Dropping...')
-    return schools[~duplicates]
+    return select_rows(schools, ~duplicates)
 
 
 def set_regon_as_index(schools: pd.DataFrame) -> pd.DataFrame:
@@ -43,7 +172,7 @@ def set_regon_as_index(schools: pd.DataFrame) -> pd.DataFrame:
     Set REGON as index to a dataframe once duplicates are dropped.
 
     :param schools: dataframe with data about schools
-    :return: dataframe, edited
+    :return: new dataframe
     """
     schools = drop_duplicate_regon(schools)
     return schools.set_index('Regon')
@@ -54,12 +183,12 @@ def drop_delegatures(schools: pd.DataFrame) -> pd.DataFrame:
     Drop facilities that are in fact delegatures, not schools.
 
     :param schools: dataframe with data about schools
-    :return: dataframe, edited
+    :return: new dataframe
     """
     delegatures = schools['Złożoność'] == 4
     print(f'{schools.loc[delegatures, "Uczniowie, wychow., słuchacze"].sum()} students from '
           f'{delegatures.sum()} delegatures found. Dropping...')
-    return schools[~delegatures]
+    return select_rows(schools, ~delegatures)
 
 
 def sum_teachers(schools: pd.DataFrame) -> pd.DataFrame:
@@ -67,47 +196,72 @@ def sum_teachers(schools: pd.DataFrame) -> pd.DataFrame:
     Sum two of the teacher columns to get one number of full-time jobs.
 
     :param schools: dataframe with data about schools
-    :return: dataframe, edited
+    :return: new dataframe, with the sum in place of the two columns
     """
     teacher_cols = ['Nauczyciele pełnozatrudnieni', 'Nauczyciele niepełnozatrudnieni (w etatach)']
-    schools['Nauczyciele'] = schools.loc[:, teacher_cols].sum(axis=1)
-    return schools.drop(teacher_cols, axis=1)
+    teachers = schools[teacher_cols].sum(axis=1)
+    schools = schools.drop(columns=teacher_cols)
+    schools['Nauczyciele'] = teachers
+    return schools
+
+
+def drop_schools_without_students(schools: pd.DataFrame) -> pd.DataFrame:
+    """
+    Drop schools with no students; they are only needed to reallocate teachers.
+
+    :param schools: dataframe with data about schools
+    :return: new dataframe
+    """
+    return select_rows(schools, schools['Uczniowie, wychow., słuchacze'] > 0)
 
 
-def reallocate_teachers_per_regon(schools: pd.DataFrame):
+def reallocate_teachers_per_regon(schools: pd.DataFrame, report: bool = True) -> (list, int):
     """
     Reallocate teachers between interconnected facilities, so that their number
     correspond to the number of classes (or students) in each school.
 
-    :param schools: dataframe with data about schools
+    :param schools: dataframe with data about schools, edited
+    :param report: whether to print the problems found (see print_reallocation_report)
+    :return:
+        - REGONs with several schools of level 1
+        - number of facilities not connected to any classes or students
     """
-    regons = schools.loc[schools.duplicated(
-        ['Regon jednostki sprawozdawczej']), 'Regon jednostki sprawozdawczej'].unique()
-    bad_regon_count = 0
-
-    for regon in regons:
-        mask_regon = schools['Regon jednostki sprawozdawczej'] == regon
-        if (schools.loc[mask_regon, 'Złożoność'] == 1).sum() > 1:
-            print(
-                f'There are several schools of level 1 with REGON equal {regon}. '
-                f'Data might be innacurate.')
-        # Assume the ratio of teachers to classes is constant in one facility
-        all_teachers = schools.loc[mask_regon, 'Nauczyciele'].sum()
-        all_classes = schools.loc[mask_regon, 'Oddziały'].sum()
-        if all_classes > 0:
-            for i in schools.loc[mask_regon].index:
-                school_classes = schools.loc[i, 'Oddziały']
-                schools.loc[i, 'Nauczyciele'] = all_teachers * school_classes/all_classes
-        else:
-            # If there are no classes, we can assume contant ratio of teachers to students
-            all_students = schools.loc[mask_regon, 'Uczniowie, wychow., słuchacze'].sum()
-            if all_students > 0:
-                for i in schools.loc[mask_regon].index:
-                    school_students = schools.loc[i, 'Uczniowie, wychow., słuchacze']
-                    schools.loc[i, 'Nauczyciele'] = all_teachers * school_students/all_students
-            else:
-                bad_regon_count += 1
+    regon = 'Regon jednostki sprawozdawczej'
+    # Facilities without the REGON are not connected to any other
+    connected = schools.duplicated([regon], keep=False) & schools[regon].notna()
+    facilities = schools.loc[connected]
+    grouped = facilities.groupby(regon, sort=False)
+
+    levels_one = (facilities['Złożoność'] == 1).groupby(facilities[regon], sort=False).sum()
+    bad_regons = list(levels_one.index[levels_one > 1])
+
+    all_teachers = grouped['Nauczyciele'].transform('sum')
+    all_classes = grouped['Oddziały'].transform('sum')
+    all_students = grouped['Uczniowie, wychow., słuchacze'].transform('sum')
 
+    # Assume the ratio of teachers to classes is constant in one facility. If
+    # there are no classes, we can assume contant ratio of teachers to students
+    per_classes = all_teachers * facilities['Oddziały'] / all_classes
+    per_students = all_teachers * facilities['Uczniowie, wychow., słuchacze'] / all_students
+    teachers = per_classes.where(all_classes > 0, per_students.where(all_students > 0,
+                                                                     facilities['Nauczyciele']))
+    schools.loc[connected, 'Nauczyciele'] = teachers
+
+    not_connected = (all_classes == 0) & (all_students == 0)
+    bad_regon_count = facilities.loc[not_connected, regon].nunique()
+    if report:
+        print_reallocation_report(bad_regons, bad_regon_count)
+    return bad_regons, bad_regon_count
+
+
+def print_reallocation_report(bad_regons: list, bad_regon_count: int):
+    """
+    :param bad_regons: REGONs with several schools of level 1
+    :param bad_regon_count: number of facilities not connected to any classes or students
+    """
+    for bad_regon in bad_regons:
+        print(f'There are several schools of level 1 with REGON equal {bad_regon}. '
+              f'Data might be innacurate.')
     if bad_regon_count > 0:
         print(f'{bad_regon_count} facilities are not connected to any classes or students; '
               f'teachers not reallocated.')
@@ -117,7 +271,7 @@ def students_per_teachers_in_school(schools: pd.DataFrame):
     """
     Add new column with number of students per teacher in school.
 
-    :param schools: dataframe with data about schools
+    :param schools: dataframe with data about schools, edited
     """
     mask = schools['Nauczyciele'] > 0
     students = schools.loc[mask, 'Uczniowie, wychow., słuchacze']
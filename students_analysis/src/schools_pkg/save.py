@@ -3,48 +3,46 @@ Provide methods used to save per teacher results.
 """
 
 import pandas as pd
+from src import output, parallel
 from src.schools_pkg import calculate
 
+GMINA_COLS = ['woj', 'pow', 'gm', 'Województwo', 'Powiat', 'Gmina', 'Typ gminy', 'Nazwa typu']
+GMINATYPE_COLS = ['Typ gminy', 'Nazwa typu']
 
-def save_gmina_statistics(schools: pd.DataFrame, outfile: str):
+
+def save_gmina_statistics(schools: pd.DataFrame, outfile: str, relative_accuracy: float = None,
+                          workers: int = 1, backend: str = parallel.DEFAULT_BACKEND):
     """
     Run calculations (min, max, mean, median of students per teacher in each
     gmina) and save the results to the file.
 
     :param schools: dataframe with data about schools
     :param outfile: where to save results
+    :param relative_accuracy: None for exact medians, or relative error of
+        approximate medians
+    :param workers: number of processes calculating gminas
+    :param backend: 'multiprocessing' or 'dask'
     """
-    groupby_cols = ['woj', 'pow', 'gm', 'Województwo', 'Powiat', 'Gmina', 'Typ gminy', 'Nazwa typu']
-
-    irrelevant_cols = ['Miejscowość', 'Złożoność', 'Nazwa szkoły, placówki', 'w tym dziewczęta',
-                       'w tym w oddziałach przedszk.', 'w tym w oddziałach innego typu', 'Oddziały',
-                       'Uczniowie, wychow., słuchacze', 'Nauczyciele',
-                       'Regon jednostki sprawozdawczej', 'Uczniów na etat nauczycielski']
-
-    gmina_stats = calculate.group_schools_with_statistics(schools, groupby_cols, irrelevant_cols)
+    gmina_stats = calculate.group_schools_with_statistics(schools, GMINA_COLS, relative_accuracy,
+                                                          workers, backend)
 
     print(f'Printing out to {outfile}...')
-    gmina_stats.to_excel(outfile)
+    output.write_frame(gmina_stats, outfile)
 
 
-def save_gminatype_statistics(schools: pd.DataFrame, outfile: str):
+def save_gminatype_statistics(schools: pd.DataFrame, outfile: str,
+                              relative_accuracy: float = None):
     """
     Run calculations (min, max, mean, median of students per teacher in each
     type of gmina) and save the results to the file.
 
     :param schools: dataframe with data about schools
     :param outfile: where to save results
+    :param relative_accuracy: None for exact medians, or relative error of
+        approximate medians
     """
-    groupby_cols = ['Typ gminy', 'Nazwa typu']
-
-    irrelevant_cols = ['woj', 'pow', 'gm', 'Województwo', 'Powiat', 'Gmina',
-                       'Miejscowość', 'Złożoność', 'Nazwa szkoły, placówki', 'w tym dziewczęta',
-                       'w tym w oddziałach przedszk.', 'w tym w oddziałach innego typu', 'Oddziały',
-                       'Uczniowie, wychow., słuchacze', 'Nauczyciele',
-                       'Regon jednostki sprawozdawczej', 'Uczniów na etat nauczycielski']
-
-    gminatype_stats = calculate.group_schools_with_statistics(
-        schools, groupby_cols, irrelevant_cols)
+    gminatype_stats = calculate.group_schools_with_statistics(schools, GMINATYPE_COLS,
+                                                              relative_accuracy)
 
     print(f'Printing out to {outfile}...\n')
-    gminatype_stats.to_excel(outfile)
+    output.write_frame(gminatype_stats, outfile)
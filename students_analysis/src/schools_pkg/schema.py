@@ -0,0 +1,85 @@
+"""
+Provide compact dtypes for data about schools, and helpers keeping them
+through the calculations.
+"""
+
+import numpy as np
+import pandas as pd
+from src import profiling
+
+# Repeated strings are categorical, codes and counts are small integers.
+# Teachers stay float64, since all the statistics are derived from them.
+# REGONs are nullable integers, since their cells may be blank.
+SCHOOLS_DTYPES = {'woj': 'int8', 'pow': 'int8', 'gm': 'int8', 'Województwo': 'category',
+                  'Powiat': 'category', 'Gmina': 'category', 'Typ gminy': 'category',
+                  'Miejscowość': 'category', 'Nazwa typu': 'category', 'Złożoność': 'int8',
+                  'Nazwa szkoły, placówki': 'object', 'Regon': 'Int64',
+                  'Uczniowie, wychow., słuchacze': 'int32', 'w tym dziewczęta': 'int32',
+                  'w tym w oddziałach przedszk.': 'int32',
+                  'w tym w oddziałach innego typu': 'int32', 'Oddziały': 'int16',
+                  'Nauczyciele pełnozatrudnieni': 'int16',
+                  'Nauczyciele niepełnozatrudnieni (w etatach)': 'float64',
+                  'Regon jednostki sprawozdawczej': 'Int64'}
+# Columns whose blank cells are missing values
+NULLABLE_COLS = ('Regon', 'Regon jednostki sprawozdawczej')
+
+
+def apply_schema(schools: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert columns of the dataframe to their compact dtypes and, when
+    profiling, report how much memory was saved.
+
+    :param schools: dataframe with data about schools
+    :return: dataframe, converted
+    """
+    dtypes = {column: dtype for column, dtype in SCHOOLS_DTYPES.items()
+              if column in schools.columns}
+    compact = blanks_to_na(schools).astype(dtypes)
+
+    # Measuring memory of strings scans all of them, so it is only done when profiling
+    if profiling.is_enabled():
+        before, after = memory_mb(schools), memory_mb(compact)
+        print(f'Data about schools takes {after:.1f} MB instead of {before:.1f} MB with compact '
+              f'dtypes.')
+    return compact
+
+
+def blanks_to_na(schools: pd.DataFrame) -> pd.DataFrame:
+    """
+    :param schools: dataframe with data about schools, read with empty cells
+        as empty strings
+    :return: dataframe with empty cells of NULLABLE_COLS as missing values
+    """
+    blanks = {column: schools[column].mask(schools[column].eq(''))
+              for column in NULLABLE_COLS
+              if column in schools.columns and schools[column].dtype == object}
+    return schools.assign(**blanks) if blanks else schools
+
+
+def memory_mb(df: pd.DataFrame) -> float:
+    """
+    :param df: any dataframe
+    :return: memory used by the dataframe, including strings, in MB
+    """
+    return df.memory_usage(deep=True).sum() / 2 ** 20
+
+
+def map_categories(column: pd.Series, mapper) -> pd.Series:
+    """
+    Map values of a column, calling the mapper only once for each distinct
+    value: for each category of a categorical column, otherwise for each value
+    found by pd.factorize. Categories of the result are sorted, so that
+    grouping and sorting give the same order as for plain strings.
+
+    :param column: categorical series, or series with repeated values
+    :param mapper: dict or function, as for pd.Series.map
+    :return: categorical series with mapped values, NaN where dict has no value
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes, uniques = column.cat.codes.to_numpy(), column.cat.categories
+    else:
+        codes, uniques = pd.factorize(column)
+    mapped = pd.Categorical(pd.Index(uniques).map(mapper))
+    codes = np.where(codes >= 0, mapped.codes[codes], -1)
+    return pd.Series(pd.Categorical.from_codes(codes, mapped.categories), index=column.index,
+                     name=column.name)
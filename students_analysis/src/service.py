@@ -0,0 +1,300 @@
+"""
+Answer queries about per teacher and per age statistics of gminas from
+results kept in memory, through a Python API or a local HTTP endpoint.
+
+The pipeline is run once when the index is built. Rows of the results are then
+indexed by gmina code, voivodeship, gmina type and school type, so that a
+lookup is a dictionary access and a filtered aggregation an intersection of
+precomputed positions; aggregations are memoized.
+
+HTTP endpoint (GET, JSON responses):
+    /gmina/<code>                   statistics of one gmina, code as '0201011' or 201011
+    /aggregate?voivodeship=...&gmina_type=...&school_type=...
+                                    statistics of all gminas matching the filters
+"""
+
+import json
+import os.path
+import threading
+from functools import reduce
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+import pandas as pd
+from src import gmina_codes, per_age_analysis
+from src.population_pkg import store as population_store
+from src.population_pkg.ages import REFERENCE_YEAR
+from src.population_pkg.parsing import POPULATION_FILE
+from src.schools_pkg.calculate import group_schools_with_statistics
+from src.schools_pkg.save import GMINA_COLS
+
+PER_TEACHER_COLS = {'Maks. uczniów na etat': 'max', 'Min. uczniów na etat': 'min',
+                    'Mediana uczniów na etat': 'median', 'Średnia uczniów na etat': 'mean'}
+FILTERS = ('voivodeship', 'gmina_type', 'school_type')
+
+
+def voivodeship_name(name: str) -> str:
+    """
+    :param name: name of voivodeship, as in data about schools ('WOJ. ŚLĄSKIE')
+        or population ('Śląskie'), in any case
+    :return: name as in data about population
+    """
+    name = name.strip()
+    if name.upper().startswith('WOJ. '):
+        name = name[5:]
+    return name.capitalize()
+
+
+def positions_by(values) -> dict:
+    """
+    :param values: value of each row
+    :return: dictionary value -> sorted positions of the rows with this value
+    """
+    return {value: positions.astype(np.int64) for value, positions in
+            pd.Series(np.asarray(values, dtype=object)).groupby(
+                np.asarray(values, dtype=object)).indices.items()}
+
+
+def to_json_value(value):
+    """
+    :param value: number from the results
+    :return: the number as a Python float, or None if it is missing
+    """
+    value = float(value)
+    return None if np.isnan(value) else value
+
+
+class StatisticsIndex:
+    """
+    Per teacher statistics of each type of school in each gmina and per age
+    statistics of each gmina, indexed for fast queries.
+    """
+
+    def __init__(self, per_teacher: pd.DataFrame, per_age: pd.DataFrame):
+        """
+        :param per_teacher: result of group_schools_with_statistics grouped by
+            schools_pkg.save.GMINA_COLS
+        :param per_age: students per school for each year of birth (columns) in
+            each gmina (index: gmina code)
+        """
+        rows = per_teacher.reset_index()
+        gmina_types = rows['Typ gminy'].astype(object).map(gmina_codes.GMINA_TYPES).fillna(
+            0).astype(int)
+        self.teacher_codes = np.asarray(gmina_codes.encode(rows['woj'], rows['pow'], rows['gm'],
+                                                           gmina_types), dtype=np.int64)
+        self.teacher_gminas = rows[['Województwo', 'Powiat', 'Gmina', 'Typ gminy']].astype(
+            object).to_numpy()
+        self.teacher_school_types = rows['Nazwa typu'].astype(object).to_numpy()
+        self.teacher_values = rows[list(PER_TEACHER_COLS)].to_numpy(dtype=float)
+        self.teacher_by = {
+            'code': positions_by(self.teacher_codes),
+            'voivodeship': positions_by([voivodeship_name(name) for name in rows['Województwo']]),
+            'gmina_type': positions_by(rows['Typ gminy'].astype(object)),
+            'school_type': positions_by(self.teacher_school_types)}
+
+        # Voivodeships of gminas in per age statistics are known from their codes
+        voivodeships = dict(zip(rows['woj'], rows['Województwo'].astype(object).map(
+            voivodeship_name)))
+        self.years = [int(year) for year in per_age.columns]
+        self.age_codes = per_age.index.to_numpy(dtype=np.int64)
+        self.age_values = per_age.to_numpy(dtype=float)
+        woj, _, _, age_types = gmina_codes.decode(self.age_codes)
+        self.age_by = {
+            'code': positions_by(self.age_codes),
+            'voivodeship': positions_by(pd.Index(woj).map(voivodeships)),
+            'gmina_type': positions_by(pd.Index(age_types).map(gmina_codes.GMINA_TYPE_NAMES))}
+
+        self._aggregates = {}
+        self._lock = threading.Lock()
+
+    def gmina(self, code) -> dict:
+        """
+        Statistics of one gmina.
+
+        :param code: gmina code, as a string ('0201011') or packed into an integer
+        :return: dictionary with the gmina, per teacher statistics of each type of
+            school and students per school for each year of birth
+        """
+        code = int(code)
+        teacher_rows = self.teacher_by['code'].get(code)
+        age_rows = self.age_by['code'].get(code)
+        if teacher_rows is None and age_rows is None:
+            raise KeyError(code)
+
+        result = {'code': gmina_codes.format_codes(code)}
+        if teacher_rows is not None:
+            voivodeship, powiat, gmina, gmina_type = self.teacher_gminas[teacher_rows[0]]
+            result.update({'voivodeship': voivodeship_name(voivodeship), 'powiat': powiat,
+                           'gmina': gmina, 'gmina_type': gmina_type})
+        result['per_teacher'] = {
+            self.teacher_school_types[row]: {
+                name: to_json_value(value)
+                for name, value in zip(PER_TEACHER_COLS.values(), self.teacher_values[row])}
+            for row in (teacher_rows if teacher_rows is not None else [])}
+        result['per_age'] = {} if age_rows is None else {
+            year: to_json_value(value) for year, value in zip(self.years,
+                                                              self.age_values[age_rows[0]])}
+        return result
+
+    def aggregate(self, voivodeship: str = None, gmina_type: str = None,
+                  school_type: str = None) -> dict:
+        """
+        Statistics of all the gminas matching the filters: min, max, mean and
+        median of the mean number of students per teacher over (gmina, school
+        type) rows, and mean number of students per school for each year of
+        birth over gminas (school type does not apply to it).
+
+        :param voivodeship: name of voivodeship, or None for all
+        :param gmina_type: 'M', 'Gm' or 'M-Gm', or None for all
+        :param school_type: name of type of school, or None for all
+        :return: dictionary with the statistics
+        """
+        if voivodeship is not None:
+            voivodeship = voivodeship_name(voivodeship)
+        key = (voivodeship, gmina_type, school_type)
+        if key in self._aggregates:
+            return self._aggregates[key]
+
+        filters = dict(zip(FILTERS, key))
+        teacher_rows = self._select(self.teacher_by, len(self.teacher_codes), filters)
+        means = self.teacher_values[teacher_rows, list(PER_TEACHER_COLS.values()).index('mean')]
+        means = means[~np.isnan(means)]
+        per_teacher = {'rows': int(len(teacher_rows))}
+        if len(means) > 0:
+            per_teacher.update({'min': float(means.min()), 'max': float(means.max()),
+                                'mean': float(means.mean()), 'median': float(np.median(means))})
+
+        filters.pop('school_type')
+        age_rows = self._select(self.age_by, len(self.age_codes), filters)
+        per_age = {year: None for year in self.years}
+        if len(age_rows) > 0:
+            per_age = {year: to_json_value(value) for year, value in
+                       zip(self.years, self.age_values[age_rows].mean(axis=0))}
+
+        result = {'filters': {name: value for name, value in zip(FILTERS, key)
+                              if value is not None},
+                  'per_teacher': per_teacher,
+                  'per_age': {'gminas': int(len(age_rows)), 'mean_per_year': per_age}}
+        # Only filters by known values are kept, so that the number of kept
+        # results is bounded by the data, not by the queries
+        if self._known(key):
+            with self._lock:
+                self._aggregates[key] = result
+        return result
+
+    def _known(self, key: tuple) -> bool:
+        """
+        :param key: value of each of FILTERS, or None for all
+        :return: whether each of the values is found in the data
+        """
+        return all(value is None or value in self.teacher_by[name] or
+                   value in self.age_by.get(name, {}) for name, value in zip(FILTERS, key))
+
+    @staticmethod
+    def _select(positions: dict, rows: int, filters: dict) -> np.ndarray:
+        """
+        :param positions: dictionaries of positions for each of the filtered fields
+        :param rows: number of all rows
+        :param filters: value of each field, or None for all
+        :return: sorted positions of the rows matching all the filters
+        """
+        selected = [positions[name].get(value, np.empty(0, dtype=np.int64))
+                    for name, value in filters.items() if value is not None]
+        if not selected:
+            return np.arange(rows)
+        return reduce(np.intersect1d, selected)
+
+
+def load_index(schools_path: str, population_path: str, cache_dir: str = None,
+               workers: int = 1, reference_year: int = REFERENCE_YEAR,
+               population_year: int = None, relative_accuracy: float = None) -> StatisticsIndex:
+    """
+    Run the pipeline, without saving the results, and index its results.
+
+    :param schools_path: path to file with data about schools
+    :param population_path: directory with data about population
+    :param cache_dir: directory with cached data and checkpoints, or None to compute
+        everything again
+    :param workers: number of processes to use for per age calculations
+    :param reference_year: year of the data about schools
+    :param population_year: year of the data about population
+    :param relative_accuracy: None for exact medians, or relative error of
+        approximate medians
+    :return: index of the results
+    """
+    schools, _, schools_per_age, _ = per_age_analysis.load_inputs(schools_path, cache_dir)
+    per_teacher = group_schools_with_statistics(schools, GMINA_COLS, relative_accuracy)
+
+    store = population_store.load_store(cache_dir, population_path)
+    per_age, _ = per_age_analysis.students_per_year(
+        schools_per_age, store, os.path.join(population_path, POPULATION_FILE), cache_dir, workers,
+        reference_year, population_year)
+    return StatisticsIndex(per_teacher, per_age)
+
+
+class StatisticsHandler(BaseHTTPRequestHandler):
+    """
+    Answer GET requests with statistics from the index of the server.
+    """
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        if len(parts) == 2 and parts[0] == 'gmina':
+            try:
+                gmina = self.server.index.gmina(parts[1])
+            except (KeyError, ValueError):
+                self.send_json(404, {'error': f'No gmina with code {parts[1]}'})
+            else:
+                self.send_json(200, gmina)
+        elif parts == ['aggregate']:
+            query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            unknown = set(query) - set(FILTERS)
+            if unknown:
+                self.send_json(400, {'error': 'Unknown filters: '
+                                              f'{", ".join(sorted(unknown))}'})
+            else:
+                self.send_json(200, self.server.index.aggregate(**query))
+        else:
+            self.send_json(404, {'error': f'Unknown path {url.path}'})
+
+    def send_json(self, status: int, body: dict):
+        content = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        # Keep the output of the program clean; queries are not logged
+        pass
+
+
+def make_server(index: StatisticsIndex, port: int,
+                host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """
+    :param index: index answering the queries
+    :param port: port to listen on, 0 for any free port
+    :param host: address to listen on; local only by default
+    :return: server, not started yet
+    """
+    server = ThreadingHTTPServer((host, port), StatisticsHandler)
+    server.index = index
+    return server
+
+
+def serve(index: StatisticsIndex, port: int, host: str = '127.0.0.1'):
+    """
+    Answer queries over HTTP until interrupted.
+
+    :param index: index answering the queries
+    :param port: port to listen on
+    :param host: address to listen on; local only by default
+    """
+    with make_server(index, port, host) as server:
+        print(f'Serving statistics on http://{host}:{server.server_address[1]}/ ...')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -52,7 +52,7 @@ def schools_reallocated(schools_sum_teachers):
 
 @pytest.fixture(scope="session")
 def schools_per_teacher(schools_reallocated):
-    schools = schools_reallocated.loc[schools_reallocated['Uczniowie, wychow., słuchacze'] > 0]
+    schools = sc_parsing.drop_schools_without_students(schools_reallocated)
     sc_parsing.students_per_teachers_in_school(schools)
     return schools
 
@@ -94,11 +94,10 @@ def per_age_df(schools_preschooled, population_path):
 @pytest.fixture(scope="session")
 def per_year(per_age_df):
     per_age, dropped_now = per_age_df
-    per_age.columns = per_age.columns.map(lambda x: 2018 - x)
-    return per_age
+    # A new frame, since per_age_df is shared with other tests
+    return per_age.rename(columns=lambda x: 2018 - x)
 
 
 @pytest.fixture(scope="session")
 def per_year_gminatyped(per_year):
-    save.add_gmina_types(per_year)
-    return per_year
+    return save.add_gmina_types(per_year)
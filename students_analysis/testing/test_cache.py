@@ -0,0 +1,71 @@
+"""
+Tests for checkpoints of stages and records of saved results.
+"""
+
+import os
+import pandas as pd
+from src import cache
+
+
+def compute_stage(frame: pd.DataFrame) -> (pd.DataFrame, int):
+    compute_stage.calls += 1
+    return frame * 2, 5
+
+
+def save_csv(frame: pd.DataFrame, outfile: str):
+    save_csv.calls += 1
+    frame.to_csv(outfile)
+
+
+def test_checkpoint(tmp_path):
+    cache_dir = os.path.join(tmp_path, 'cache')
+    frame = pd.DataFrame({'a': [1, 2]})
+    compute_stage.calls = 0
+
+    first, dropped = cache.checkpoint(cache_dir, 'double', [frame], compute_stage, frame)
+    second, dropped_again = cache.checkpoint(cache_dir, 'double', [frame], compute_stage, frame)
+    assert compute_stage.calls == 1
+    assert first.equals(second)
+    assert dropped == dropped_again == 5
+
+    changed = pd.DataFrame({'a': [1, 3]})
+    third, _ = cache.checkpoint(cache_dir, 'double', [changed], compute_stage, changed)
+    assert compute_stage.calls == 2
+    assert list(third['a']) == [2, 6]
+
+
+def test_save_if_changed(tmp_path):
+    cache_dir = os.path.join(tmp_path, 'cache')
+    outfile = os.path.join(tmp_path, 'out.csv')
+    frame = pd.DataFrame({'a': [1, 2]})
+    save_csv.calls = 0
+
+    cache.save_if_changed(cache_dir, save_csv, frame, outfile)
+    cache.save_if_changed(cache_dir, save_csv, frame, outfile)
+    assert save_csv.calls == 1
+
+    os.remove(outfile)
+    cache.save_if_changed(cache_dir, save_csv, frame, outfile)
+    assert save_csv.calls == 2
+
+    cache.save_if_changed(cache_dir, save_csv, frame + 1, outfile)
+    assert save_csv.calls == 3
+
+
+def test_code_version(tmp_path, monkeypatch):
+    module = os.path.join(tmp_path, 'stage.py')
+    with open(module, 'w', encoding='utf-8') as file:
+        file.write('STEP = 1\n')
+    version = cache.code_version(str(tmp_path))
+    assert cache.code_version(str(tmp_path)) == version
+
+    with open(module, 'w', encoding='utf-8') as file:
+        file.write('STEP = 2\n')
+    cache.code_version.cache_clear()
+    assert cache.code_version(str(tmp_path)) != version
+
+    # Checkpoints of the same stage and inputs are not reused after the code changes
+    frame = pd.DataFrame({'a': [1]})
+    key = cache.input_key('double', [frame])
+    monkeypatch.setattr(cache, 'code_version', lambda *paths: 'changed')
+    assert cache.input_key('double', [frame]) != key
@@ -0,0 +1,31 @@
+"""
+Tests for lazy loading of submodules of the package.
+"""
+
+import subprocess
+import sys
+import pytest
+import src
+import src.population_pkg
+
+
+def imports_pandas(statement: str) -> bool:
+    check = "; import sys; print('pandas' in sys.modules)"
+    result = subprocess.run([sys.executable, '-c', statement + check], check=True,
+                            capture_output=True, text=True)
+    return result.stdout.strip() == 'True'
+
+
+def test_no_pandas_on_import():
+    assert not imports_pandas('import src')
+    assert not imports_pandas('from src.population_pkg.ages import agerange_for_school')
+    assert not imports_pandas('from src import cli; cli.build_parser()')
+    assert imports_pandas('import src.per_age_analysis')
+
+
+def test_lazy_submodules():
+    assert src.population_pkg.calculate.agerange_for_school is \
+        src.population_pkg.ages.agerange_for_school
+    assert 'schools_pkg' in dir(src)
+    with pytest.raises(AttributeError):
+        src.no_such_module
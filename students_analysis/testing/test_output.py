@@ -0,0 +1,55 @@
+"""
+Tests for writing result tables.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from src import output
+
+
+@pytest.fixture
+def results():
+    index = pd.MultiIndex.from_tuples([('Gm', 2005), ('Gm', 2006), ('M', 2005)],
+                                      names=['Typ gminy', 'Rok urodzenia'])
+    return pd.DataFrame({'Maks': [10, 20, 30], 'Średnia': [1.5, np.nan, 2.25]}, index=index)
+
+
+def test_write_xlsx(results, tmp_path):
+    outfile = os.path.join(tmp_path, 'results.xlsx')
+    output.write_frame(results, outfile)
+
+    written = pd.read_excel(outfile, index_col=[0, 1])
+    pd.testing.assert_frame_equal(written, results)
+    assert written.index.equals(results.index)
+
+
+def test_write_csv(results, tmp_path):
+    outfile = os.path.join(tmp_path, 'results.csv')
+    output.write_frame(results, outfile)
+
+    written = pd.read_csv(outfile, index_col=[0, 1])
+    pd.testing.assert_frame_equal(written, results)
+
+
+def test_write_parquet(results, tmp_path):
+    pytest.importorskip('pyarrow')
+    outfile = os.path.join(tmp_path, 'results.parquet')
+    output.write_frame(results, outfile)
+
+    pd.testing.assert_frame_equal(pd.read_parquet(outfile), results)
+
+
+def test_formats():
+    outputs = ['gmina', 'gminatype', 'per_age']
+    assert output.parse_formats(None, outputs) == dict.fromkeys(outputs)
+    assert output.parse_formats(['csv', 'per_age=parquet'], outputs) == \
+        {'gmina': 'csv', 'gminatype': 'csv', 'per_age': 'parquet'}
+    with pytest.raises(ValueError):
+        output.parse_formats(['gmina=ods'], outputs)
+
+    assert output.with_format('results\\gmina.xlsx', 'csv') == 'results\\gmina.csv'
+    assert output.infer_format('gmina.XLSX') == 'xlsx'
+    with pytest.raises(ValueError):
+        output.infer_format('gmina.xls')
@@ -0,0 +1,63 @@
+"""
+Tests for parallel calculation of statistics of groups.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from src import parallel
+from src.schools_pkg.calculate import group_schools_with_statistics
+from src.schools_pkg.save import GMINA_COLS
+
+
+@pytest.fixture(scope="module")
+def schools():
+    rng = np.random.default_rng(0)
+    size = 5000
+    codes = rng.integers(0, 300, size)
+    frame = pd.DataFrame({'woj': codes // 100 * 2 + 2, 'pow': codes // 10 % 10 + 1,
+                          'gm': codes % 10 + 1,
+                          'Województwo': pd.Categorical((codes // 100).astype(str)),
+                          'Powiat': pd.Categorical((codes // 10).astype(str)),
+                          'Gmina': pd.Categorical(codes.astype(str)),
+                          'Typ gminy': pd.Categorical(rng.choice(['1', '2', '3'], size)),
+                          'Nazwa typu': pd.Categorical(rng.choice(['Przedszkole',
+                                                                   'Szkoła podstawowa'], size)),
+                          'Uczniowie, wychow., słuchacze': rng.integers(1, 500, size),
+                          'Nauczyciele': rng.lognormal(2, 1, size)})
+    frame.loc[::50, 'Nauczyciele'] = 0
+    frame['Uczniów na etat nauczycielski'] = frame['Uczniowie, wychow., słuchacze'] \
+        / frame['Nauczyciele']
+    return frame
+
+
+def test_partition_rows(schools):
+    parts = parallel.partition_rows(schools, ['woj', 'pow', 'gm'], 4)
+    assert len(parts) == 4
+    assert sorted(np.concatenate([part.index for part in parts])) == list(schools.index)
+
+    gminas = [set(part.groupby(['woj', 'pow', 'gm']).groups) for part in parts]
+    assert sum(len(part) for part in gminas) == len(set.union(*gminas))
+    for part in parts:
+        assert part.index.is_monotonic_increasing
+
+
+@pytest.mark.parametrize('relative_accuracy', [None, 0.01])
+def test_parallel_statistics(schools, relative_accuracy):
+    serial = group_schools_with_statistics(schools, GMINA_COLS, relative_accuracy)
+    for workers in [2, 3]:
+        result = group_schools_with_statistics(schools, GMINA_COLS, relative_accuracy, workers)
+        pd.testing.assert_frame_equal(result, serial, check_exact=True)
+
+
+def test_backends(schools):
+    assert 'multiprocessing' in parallel.available_backends()
+    with pytest.raises(ValueError):
+        parallel.map_partitions(len, [schools], 2, 'threads')
+
+
+def test_dask_backend(schools):
+    pytest.importorskip('dask')
+    serial = group_schools_with_statistics(schools, GMINA_COLS)
+    result = group_schools_with_statistics(schools, GMINA_COLS, workers=2, backend='dask')
+    pd.testing.assert_frame_equal(result, serial, check_exact=True)
@@ -4,6 +4,7 @@ Tests for functions used in per_age_analysis.
 
 import os
 import pandas as pd
+from src import gmina_codes
 import src.schools_for_ages as sfa
 import src.population_pkg.parsing as pop_parsing
 from src.population_pkg import calculate
@@ -16,6 +17,34 @@ def test_population_df(population_path):
     assert population.iloc[0, 0] == 170303
 
 
+def test_population_all(population_path):
+    population = pop_parsing.load_population(population_path)
+    assert population.index.names == ['Województwo', 'Code', 'Specification']
+    assert population.index.get_level_values('Województwo').nunique() == 16
+    assert population.loc['Śląskie'].equals(pop_parsing.load_population_df(population_path,
+                                                                            'Śląskie'))
+
+
+def fix_index_and_cols_loop(population: pd.DataFrame) -> pd.DataFrame:
+    # Row by row version of pop_parsing.fix_index_and_cols, used as a reference
+    population.columns = ['Specification', 'Code', 'Total']
+    for i in population.index:
+        if population.loc[i, 'Code'] != '       ':
+            last_code = population.loc[i, 'Code']
+        else:
+            population.loc[i, 'Code'] = last_code
+    population['Code'] = gmina_codes.parse(population['Code'])
+    population = population.dropna(subset=['Code']).astype({'Code': 'int64'})
+    return population.set_index(['Code', 'Specification'])
+
+
+def test_fix_index_and_cols(population_path):
+    sheets = pd.read_excel(os.path.join(population_path, 'tabela12.xls'), sheet_name=None,
+                           skiprows=8, header=None, usecols='A:C')
+    for sheet in sheets.values():
+        assert pop_parsing.fix_index_and_cols(sheet.copy()).equals(fix_index_and_cols_loop(sheet))
+
+
 def test_simplify_school_types(schools_simplified):
     schools, dropped_now = schools_simplified
     assert len(schools['Nazwa typu'].unique()) == 9
@@ -23,8 +52,19 @@ def test_simplify_school_types(schools_simplified):
 
 
 def test_gmina_codes(schools_gmina_coded):
-    assert schools_gmina_coded['Kod gminy'].iloc[0] == '0201011'
-    assert schools_gmina_coded['Kod gminy'].iloc[1000] == '0410033'
+    assert schools_gmina_coded['Kod gminy'].iloc[0] == 201011
+    assert schools_gmina_coded['Kod gminy'].iloc[1000] == 410033
+    assert gmina_codes.format_codes(schools_gmina_coded['Kod gminy'].iloc[0]) == '0201011'
+
+
+def test_gmina_codes_packing():
+    codes = gmina_codes.encode([2, 24], [1, 61], [1, 1], [1, 1])
+    assert list(codes) == [201011, 2461011]
+    assert [list(part) for part in gmina_codes.decode(codes)] == [[2, 24], [1, 61], [1, 1],
+                                                                  [1, 1]]
+    assert list(gmina_codes.format_codes(codes)) == ['0201011', '2461011']
+    assert list(gmina_codes.parse(pd.Series(['0201011', 2461011, '       ']))[:2]) == [201011,
+                                                                                      2461011]
 
 
 def test_voivodeship_names(schools_voivodeships):
@@ -53,10 +93,10 @@ def test_per_age_in_gmina(schools_preschooled, population_path):
     school_ages = calculate.agerange_for_school()
     current_ages = [str(age).ljust(2).rjust(9) for age in range(5, 22)]
     population = pop_parsing.load_population_df(population_path, 'Śląskie')
-    population_gmina = population.loc['2461011'].loc[current_ages]
+    population_gmina = population.loc[2461011].loc[current_ages]
 
     assert calculate.per_age_in_gmina(population_gmina, schools_preschooled,
-                                      'Śląskie', '2461011', school_ages) == {3: 9.13311416416632,
+                                      'Śląskie', 2461011, school_ages) == {3: 9.13311416416632,
                                                                              4: 9.055668011350857,
                                                                              5: 9.448430643486416,
                                                                              6: 9.653109761641568,
@@ -75,6 +115,15 @@ def test_per_age_in_gmina(schools_preschooled, population_path):
                                                                              19: 4.797690602363932}
 
 
+def test_population_per_age(population_path):
+    population = calculate.population_per_age(pop_parsing.load_population(population_path))
+    assert population.index.names == ['Województwo', 'Code']
+    assert list(population.columns) == list(range(3, 20))
+    assert list(population.loc[('Śląskie', 2461011)]) == list(
+        pop_parsing.load_population_df(population_path, 'Śląskie').loc[2461011].loc[
+            [str(age).ljust(2).rjust(9) for age in range(5, 22)], 'Total'])
+
+
 def test_students_per_age(per_age_df):
     per_age, dropped_now = per_age_df
     assert dropped_now == 15145
@@ -98,15 +147,23 @@ def test_students_per_age(per_age_df):
                                        0.0]
 
 
+def test_students_per_age_workers(per_age_df, schools_preschooled, population_path):
+    per_age, dropped_now = per_age_df
+    per_age_parallel, dropped_parallel = calculate.students_per_age(schools_preschooled,
+                                                                    population_path, workers=4)
+    assert dropped_parallel == dropped_now
+    assert per_age_parallel.equals(per_age)
+
+
 def test_per_year(per_year):
     assert list(per_year.columns) == [2015, 2014, 2013, 2012, 2011, 2010, 2009, 2008, 2007, 2006,
                                       2005, 2004, 2003, 2002, 2001, 2000, 1999]
 
 
 def test_add_gmina_types(per_year_gminatyped):
-    assert per_year_gminatyped.loc['0201011', 'Typ gminy'] == 'M'
-    assert per_year_gminatyped.loc['0201032', 'Typ gminy'] == 'Gm'
-    assert per_year_gminatyped.loc['0201043', 'Typ gminy'] == 'M-Gm'
+    assert per_year_gminatyped.loc[201011, 'Typ gminy'] == 'M'
+    assert per_year_gminatyped.loc[201032, 'Typ gminy'] == 'Gm'
+    assert per_year_gminatyped.loc[201043, 'Typ gminy'] == 'M-Gm'
 
 
 def test_save_per_age_statistics(per_year_gminatyped, tmp_path):
@@ -5,6 +5,7 @@ Tests for functions used in per_teacher_analysis.
 import math
 import os
 import pandas as pd
+import pytest
 import src.schools_pkg.parsing as sc_parsing
 from src.schools_pkg.save import save_gmina_statistics
 from src.schools_pkg.save import save_gminatype_statistics
@@ -17,6 +18,13 @@ def test_load_schools(schools_loaded):
     assert schools_loaded['Uczniowie, wychow., słuchacze'].sum() == 6388792
 
 
+def test_schools_dtypes(schools_loaded):
+    assert schools_loaded['Województwo'].dtype == 'category'
+    assert schools_loaded['Nazwa typu'].dtype == 'category'
+    assert schools_loaded['woj'].dtype == 'int8'
+    assert schools_loaded['Uczniowie, wychow., słuchacze'].dtype == 'int32'
+
+
 def test_drop_duplicate(schools_loaded):
     schools = sc_parsing.drop_duplicate_regon(schools_loaded)
     assert len(schools_loaded) - len(schools) == schools_loaded.duplicated(['Regon']).sum()
@@ -37,14 +45,15 @@ def test_drop_delegatures(schools_no_delegatures, schools_regonized):
 def test_sum_teachers(schools_sum_teachers, schools_no_delegatures):
     teacher_cols = ['Nauczyciele pełnozatrudnieni', 'Nauczyciele niepełnozatrudnieni (w etatach)']
     assert schools_sum_teachers.columns.any() not in teacher_cols
+    # Sums of floats may differ in the last bits, depending on the order of additions
     assert schools_sum_teachers.loc[:, 'Nauczyciele'].sum(
-    ) == schools_no_delegatures.loc[:, teacher_cols].sum().sum()
+    ) == pytest.approx(schools_no_delegatures.loc[:, teacher_cols].sum().sum(), rel=1e-12)
 
 
 def test_reallocate_per_regon(schools_reallocated, schools_no_delegatures):
     teacher_cols = ['Nauczyciele pełnozatrudnieni', 'Nauczyciele niepełnozatrudnieni (w etatach)']
     assert schools_reallocated['Nauczyciele'].sum(
-    ) == schools_no_delegatures.loc[:, teacher_cols].sum().sum()
+    ) == pytest.approx(schools_no_delegatures.loc[:, teacher_cols].sum().sum(), rel=1e-12)
 
 
 def test_per_teacher(schools_per_teacher):
@@ -58,9 +67,8 @@ def test_per_teacher(schools_per_teacher):
 
 
 def test_gmina_statistics(schools_reallocated, tmp_path):
-    # Redo the operation to avoid potential view/copy/in-place operations mess
-    schools_per_teacher = schools_reallocated.loc[schools_reallocated[
-                                                      'Uczniowie, wychow., słuchacze'] > 0]
+    # Redo the operation on a new dataframe, so that the fixture is not edited
+    schools_per_teacher = sc_parsing.drop_schools_without_students(schools_reallocated)
     sc_parsing.students_per_teachers_in_school(schools_per_teacher)
 
     outfile = os.path.join(tmp_path, 'gmina_per_teacher.xlsx')
@@ -70,14 +78,14 @@ def test_gmina_statistics(schools_reallocated, tmp_path):
     assert results_gmina.index.names == ['woj', 'pow', 'gm', 'Województwo', 'Powiat', 'Gmina',
                                          'Typ gminy', 'Nazwa typu']
     assert results_gmina.shape == (10144, 4)
-    assert (results_gmina.iloc[0] == [15.7002891101831, 7.121862988921546,
-                                      11.78861788617886, 11.50520465810591]).all()
+    assert list(results_gmina.iloc[0]) == pytest.approx([15.7002891101831, 7.121862988921546,
+                                                         11.78861788617886, 11.50520465810591],
+                                                        rel=1e-12)
 
 
 def test_gminatype_statistics(schools_reallocated, tmp_path):
-    # Redo the operation to avoid potential view/copy/in-place operations mess
-    schools_per_teacher = schools_reallocated.loc[schools_reallocated[
-                                                      'Uczniowie, wychow., słuchacze'] > 0]
+    # Redo the operation on a new dataframe, so that the fixture is not edited
+    schools_per_teacher = sc_parsing.drop_schools_without_students(schools_reallocated)
     sc_parsing.students_per_teachers_in_school(schools_per_teacher)
 
     outfile = os.path.join(tmp_path, 'gminatype_per_teacher.xlsx')
@@ -86,5 +94,7 @@ def test_gminatype_statistics(schools_reallocated, tmp_path):
     results_gminatype = pd.read_excel(outfile, index_col=list(range(2)))
     assert results_gminatype.index.names == ['Typ gminy', 'Nazwa typu']
     assert results_gminatype.shape == (66, 4)
-    assert (results_gminatype.iloc[0] == [39.87975951903807, 0.3630862329803329,
-                                          5.936502603729213, 6.265061786032909]).all()
+    assert list(results_gminatype.iloc[0]) == pytest.approx([39.87975951903807,
+                                                             0.3630862329803329,
+                                                             5.936502603729213,
+                                                             6.265061786032909], rel=1e-12)
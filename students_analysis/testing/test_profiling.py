@@ -0,0 +1,69 @@
+"""
+Tests for the instrumentation of pipeline stages.
+"""
+
+import json
+import os
+import numpy as np
+import pandas as pd
+from src import profiling
+
+
+def drop_first(df: pd.DataFrame) -> pd.DataFrame:
+    return df.iloc[1:]
+
+
+def add_column(df: pd.DataFrame) -> int:
+    df['b'] = 1
+    return 0
+
+
+def test_disabled_stage():
+    profiling.disable()
+    df = pd.DataFrame({'a': [1, 2, 3]})
+    assert len(profiling.stage('drop', drop_first, df)) == 2
+    assert profiling.report()['stages'] == []
+
+
+def test_enabled_stage(tmp_path):
+    profiling.enable()
+    df = pd.DataFrame({'a': [1, 2, 3]})
+    profiling.stage('drop', drop_first, df)
+    profiling.stage('add', add_column, df)
+
+    outfile = os.path.join(tmp_path, 'report.json')
+    profiling.save_report(outfile)
+    profiling.disable()
+    with open(outfile, encoding='utf-8') as file:
+        stages = json.load(file)['stages']
+
+    assert [entry['stage'] for entry in stages] == ['drop', 'add']
+    assert (stages[0]['rows_in'], stages[0]['rows_out']) == (3, 2)
+    assert (stages[1]['rows_in'], stages[1]['rows_out']) == (3, 3)
+    assert stages[0]['seconds'] >= 0
+    # Memory of stages is only traced on request
+    assert stages[0]['peak_allocated_mb'] is None
+
+
+def allocate(megabytes: int) -> int:
+    return len(np.ones(megabytes * 2 ** 20 // 8))
+
+
+def allocate_nested(megabytes: int) -> int:
+    return profiling.stage('inner', allocate, megabytes)
+
+
+def test_stage_memory():
+    profiling.enable(trace_memory=True)
+    profiling.stage('large', allocate, 40)
+    profiling.stage('small', allocate, 1)
+    profiling.stage('outer', allocate_nested, 20)
+    report = profiling.report()
+    profiling.disable()
+
+    memory = {entry['stage']: entry['peak_allocated_mb'] for entry in report['stages']}
+    # Each stage has its own peak, not the peak of the process so far
+    assert 40 <= memory['large'] < 45
+    assert 1 <= memory['small'] < 5
+    assert 20 <= memory['inner'] <= memory['outer'] < 25
+    assert report['peak_rss_mb'] > 40
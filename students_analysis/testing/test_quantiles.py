@@ -0,0 +1,69 @@
+"""
+Tests for exact medians and quantile sketches.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from src import quantiles
+from src.schools_pkg.calculate import group_schools_with_statistics
+
+
+@pytest.fixture
+def values():
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame({'group': rng.integers(0, 50, 20000),
+                          'kind': pd.Categorical(rng.choice(['a', 'b'], 20000)),
+                          'value': rng.lognormal(2, 1, 20000)})
+    frame.loc[::40, 'value'] = 0
+    frame.loc[::70, 'value'] = np.nan
+    return frame
+
+
+def test_median():
+    values = np.array([[1, 4, np.nan], [3, np.nan, np.nan], [2, 2, np.nan], [10, 1, np.nan]])
+    expected = pd.DataFrame(values).median().to_numpy()
+    assert np.array_equal(quantiles.median(values), expected, equal_nan=True)
+
+
+def test_sketch_error(values):
+    accuracy = 0.01
+    sketch = quantiles.QuantileSketch.from_frame(values, ['group', 'kind'], 'value', accuracy)
+    grouped = values.groupby(['group', 'kind'], observed=True)['value']
+    for q in [0, 0.1, 0.5, 0.9, 1]:
+        exact = grouped.quantile(q)
+        approximate = sketch.quantile(q)
+        assert approximate.index.equals(exact.index)
+        assert (np.abs(approximate - exact) <= accuracy * exact + 1e-12).all()
+
+
+def test_sketch_merge(values):
+    whole = quantiles.QuantileSketch.from_frame(values, ['group', 'kind'], 'value')
+    chunks = [quantiles.QuantileSketch.from_frame(values.iloc[start:start + 3000],
+                                                  ['group', 'kind'], 'value')
+              for start in range(0, len(values), 3000)]
+    merged = chunks[0]
+    for chunk in chunks[1:]:
+        merged = merged.merge(chunk)
+    pd.testing.assert_series_equal(merged.median(), whole.median())
+
+    with pytest.raises(ValueError):
+        merged.merge(quantiles.QuantileSketch.from_frame(values, ['group'], 'value', 0.05))
+
+
+def test_sketch_negative(values):
+    values['value'] -= 100
+    with pytest.raises(ValueError):
+        quantiles.QuantileSketch.from_frame(values, ['group'], 'value')
+
+
+def test_approximate_statistics(values):
+    schools = pd.DataFrame({'Typ gminy': values['kind'], 'Nazwa typu': values['group'],
+                            'Uczniów na etat nauczycielski': values['value'],
+                            'Uczniowie, wychow., słuchacze': 10, 'Nauczyciele': 1.0})
+    exact = group_schools_with_statistics(schools, ['Typ gminy', 'Nazwa typu'])
+    approximate = group_schools_with_statistics(schools, ['Typ gminy', 'Nazwa typu'], 0.01)
+
+    median = 'Mediana uczniów na etat'
+    pd.testing.assert_frame_equal(approximate.drop(columns=median), exact.drop(columns=median))
+    assert (np.abs(approximate[median] - exact[median]) <= 0.01 * exact[median]).all()
@@ -0,0 +1,358 @@
+"""
+Tests running the whole pipeline on small synthetic data, which do not need
+the official files.
+"""
+
+import json
+import os
+import pickle
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+import warnings
+import numpy as np
+import openpyxl
+import pandas as pd
+import pytest
+from benchmarks import synthetic
+from src import batch, gmina_codes, out_of_core, per_age_analysis, per_teacher_analysis, service
+from src.population_pkg import calculate as pop_calculate
+from src.population_pkg import parsing as pop_parsing
+from src.population_pkg import store as population_store
+from src.schools_pkg import parsing, schema
+from src.schools_pkg.calculate import merge_statistics
+import src.schools_for_ages as sfa
+
+
+@pytest.fixture(scope="session")
+def synthetic_paths(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('synthetic')
+    schools = synthetic.generate_schools(0.05)
+    schools_path = os.path.join(directory, 'schools.xlsx')
+    synthetic.write_schools(schools, schools_path)
+    synthetic.write_population(synthetic.generate_population(schools), directory)
+    return schools_path, str(directory)
+
+
+def test_generate_schools():
+    schools = synthetic.generate_schools(0.1)
+    assert len(schools) == 3000
+    assert schools['Województwo'].str.startswith('WOJ. ').all()
+    assert (schools['Złożoność'] == 4).any()
+    assert schools.duplicated(['Regon']).any()
+
+
+def test_stream_schools_df(synthetic_paths):
+    schools_path, _ = synthetic_paths
+    loaded = parsing.load_schools_df(schools_path)
+    expected = parsing.drop_delegatures(parsing.set_regon_as_index(loaded))
+
+    # Small chunks, so that duplicates of REGONs are found across chunks
+    streamed, students_dropped = parsing.stream_schools_df(schools_path, chunk_rows=97)
+    pd.testing.assert_frame_equal(streamed, expected)
+    assert students_dropped == (loaded['Uczniowie, wychow., słuchacze'].sum()
+                                - expected['Uczniowie, wychow., słuchacze'].sum())
+
+
+def test_stream_blank_rows(synthetic_paths, tmp_path):
+    schools_path, _ = synthetic_paths
+    workbook = openpyxl.load_workbook(schools_path)
+    sheet = workbook.worksheets[0]
+    # Official exports end with blank rows which only carry formatting
+    sheet.cell(row=sheet.max_row + 1, column=1).font = openpyxl.styles.Font(bold=True)
+    formatted_path = os.path.join(tmp_path, 'formatted.xlsx')
+    workbook.save(formatted_path)
+
+    expected = parsing.drop_delegatures(parsing.set_regon_as_index(
+        parsing.load_schools_df(formatted_path)))
+    streamed, _ = parsing.stream_schools_df(formatted_path)
+    pd.testing.assert_frame_equal(streamed, expected)
+
+
+def test_stream_missing_column(synthetic_paths, tmp_path):
+    schools_path, _ = synthetic_paths
+    workbook = openpyxl.load_workbook(schools_path)
+    sheet = workbook.worksheets[0]
+    header = [cell.value for cell in sheet[1]]
+    sheet.cell(row=1, column=header.index('Nauczyciele pełnozatrudnieni') + 1).value = 'Renamed'
+    renamed_path = os.path.join(tmp_path, 'renamed.xlsx')
+    workbook.save(renamed_path)
+
+    with pytest.raises(ValueError, match='Nauczyciele pełnozatrudnieni'):
+        parsing.stream_schools_df(renamed_path)
+
+
+def test_blank_regons(synthetic_paths, tmp_path):
+    schools_path, _ = synthetic_paths
+    workbook = openpyxl.load_workbook(schools_path)
+    sheet = workbook.worksheets[0]
+    header = [cell.value for cell in sheet[1]]
+    for column in ['Regon', 'Regon jednostki sprawozdawczej']:
+        for row in [5, 6, 50]:
+            sheet.cell(row=row, column=header.index(column) + 1).value = None
+    blank_path = os.path.join(tmp_path, 'blank.xlsx')
+    workbook.save(blank_path)
+
+    loaded = parsing.load_schools_df(blank_path)
+    assert loaded['Regon'].isna().sum() == 3
+    expected = parsing.drop_delegatures(parsing.set_regon_as_index(loaded))
+    streamed, _ = parsing.stream_schools_df(blank_path, chunk_rows=20)
+    pd.testing.assert_frame_equal(streamed, expected)
+
+    schools, _ = per_teacher_analysis.students_per_teacher(streamed)
+    assert schools['Nauczyciele'].notna().all()
+
+
+def test_pipeline(synthetic_paths, tmp_path):
+    schools_path, population_path = synthetic_paths
+    outfiles = [os.path.join(tmp_path, name) for name in ['gmina.xlsx', 'gminatype.xlsx',
+                                                           'per_age.xlsx']]
+
+    schools, dropped_1 = per_teacher_analysis.run(schools_path, outfiles[0], outfiles[1])
+    dropped_2 = per_age_analysis.run(schools, population_path, outfiles[2])
+
+    assert dropped_1 > 0 and dropped_2 > 0
+    assert pd.read_excel(outfiles[0], index_col=list(range(8))).shape[1] == 4
+    assert pd.read_excel(outfiles[1], index_col=[0, 1]).shape[1] == 4
+    assert pd.read_excel(outfiles[2], index_col=[0, 1]).shape == (51, 4)
+
+
+@pytest.mark.parametrize('workers, relative_accuracy', [(1, None), (2, None), (2, 0.01)])
+def test_out_of_core(synthetic_paths, tmp_path, workers, relative_accuracy):
+    schools_path, population_path = synthetic_paths
+    names = ['gmina.csv', 'gminatype.csv', 'per_age.csv']
+    expected = [os.path.join(tmp_path, 'expected_' + name) for name in names]
+    outfiles = [os.path.join(tmp_path, name) for name in names]
+
+    schools, dropped_1 = per_teacher_analysis.run(schools_path, expected[0], expected[1],
+                                                  relative_accuracy=relative_accuracy)
+    dropped_2 = per_age_analysis.run(schools, population_path, expected[2],
+                                     relative_accuracy=relative_accuracy)
+    result = out_of_core.run(schools_path, population_path, *outfiles, workers=workers,
+                             partitions=3, relative_accuracy=relative_accuracy,
+                             spill_dir=str(tmp_path))
+
+    assert result == (schools['Uczniowie, wychow., słuchacze'].sum(), dropped_1, dropped_2)
+    # Partitions are removed after the run, leaving only the results
+    assert sorted(os.listdir(tmp_path)) == sorted(names + ['expected_' + name for name in names])
+    for expected_file, outfile, index_cols in zip(expected, outfiles, [8, 2, 2]):
+        index_col = list(range(index_cols))
+        # Means of per teacher statistics are sums of partial sums, so they may
+        # differ in the last bits; medians from merged sketches and per age
+        # statistics are exact
+        pd.testing.assert_frame_equal(pd.read_csv(outfile, index_col=index_col),
+                                      pd.read_csv(expected_file, index_col=index_col),
+                                      check_exact=outfile == outfiles[2], rtol=1e-12)
+
+
+def test_out_of_core_no_schools(synthetic_paths, tmp_path):
+    schools = synthetic.generate_schools(0.01)
+    schools['Złożoność'] = 4
+    schools_path = os.path.join(tmp_path, 'delegatures.xlsx')
+    synthetic.write_schools(schools, schools_path)
+
+    paths, dropped = out_of_core.spill_partitions(schools_path, str(tmp_path), 3)
+    assert len(paths) == 1 and dropped == schools['Uczniowie, wychow., słuchacze'].sum()
+    reduced = out_of_core.reduce_partition(paths[0])
+    assert reduced['students'] == 0 and reduced['per_age'].empty
+    stats = merge_statistics([reduced['gmina']])
+    assert stats.empty and len(stats.columns) == 4
+
+
+def test_batch(synthetic_paths, tmp_path, capsys):
+    schools_path, population_path = synthetic_paths
+    manifest = {'outdir': str(tmp_path / 'results'), 'format': 'csv',
+                'runs': [{'name': '2018', 'schools': schools_path, 'population': population_path},
+                         {'name': '2017', 'schools': schools_path, 'population': population_path,
+                          'reference_year': 2017, 'population_year': 2020}]}
+    manifest_path = tmp_path / 'manifest.json'
+    manifest_path.write_text(json.dumps(manifest), encoding='utf-8')
+
+    dropped = batch.run_batch(batch.load_manifest(str(manifest_path)))
+    # The schools were parsed only once for both runs
+    assert capsys.readouterr().out.count('delegatures found') == 1
+    assert set(dropped) == {'2018', '2017'}
+
+    per_age_2018 = pd.read_csv(tmp_path / 'results' / '2018' / 'gminatype_per_age.csv',
+                               index_col=[0, 1])
+    per_age_2017 = pd.read_csv(tmp_path / 'results' / '2017' / 'gminatype_per_age.csv',
+                               index_col=[0, 1])
+    assert per_age_2018.index.get_level_values('Rok urodzenia').max() == 2015
+    # Three years between the data, so the youngest are born in 2014
+    assert per_age_2017.index.get_level_values('Rok urodzenia').max() == 2014
+
+    outfile = str(tmp_path / 'single.csv')
+    schools, _ = per_teacher_analysis.run(schools_path, str(tmp_path / 'g.csv'),
+                                          str(tmp_path / 'gt.csv'))
+    per_age_analysis.run(schools, population_path, outfile)
+    pd.testing.assert_frame_equal(pd.read_csv(outfile, index_col=[0, 1]), per_age_2018)
+    pd.testing.assert_frame_equal(
+        pd.read_csv(tmp_path / 'g.csv', index_col=list(range(8))),
+        pd.read_csv(tmp_path / 'results' / '2017' / 'gmina_per_teacher.csv',
+                    index_col=list(range(8))))
+
+    # Names of runs can not point outside outdir
+    for name in ['../x', '/tmp/x', '..', 'a\\b']:
+        manifest['runs'][0]['name'] = name
+        manifest_path.write_text(json.dumps(manifest), encoding='utf-8')
+        with pytest.raises(ValueError):
+            batch.load_manifest(str(manifest_path))
+
+
+def test_population_store(synthetic_paths, tmp_path):
+    _, population_path = synthetic_paths
+    population = pop_parsing.load_population(population_path)
+    cache_dir = str(tmp_path / 'cache')
+
+    store = population_store.load_store(cache_dir, population_path)
+    assert isinstance(store.counts, np.memmap)
+    # Opened again from the cache, and sent to other processes by its directory
+    assert population_store.load_store(cache_dir, population_path).directory == store.directory
+    assert len(pickle.dumps(store)) < 1000
+    assert pickle.loads(pickle.dumps(store)).codes.tolist() == store.codes.tolist()
+
+    expected = pop_calculate.population_per_age(population)
+    per_age = store.per_age(expected.index, [age + 2 for age in expected.columns])
+    np.testing.assert_array_equal(per_age.to_numpy(), expected.to_numpy(dtype=float))
+
+    sheetname, code = expected.index[0]
+    gmina = population.loc[(sheetname, code), 'Total']
+    assert store.lookup(code)[7] == gmina.loc[gmina.index.str.strip() == '7'].iloc[0]
+    with pytest.raises(KeyError):
+        store.lookup(1)
+
+    # Stores written by another version are written again, not used
+    meta_path = os.path.join(store.directory, 'meta.json')
+    with open(meta_path, encoding='utf-8') as file:
+        meta = json.load(file)
+    with open(meta_path, 'w', encoding='utf-8') as file:
+        json.dump(dict(meta, version=population_store.STORE_VERSION - 1), file)
+    with pytest.raises(ValueError):
+        population_store.open_store(store.directory)
+    rewritten = population_store.load_store(cache_dir, population_path)
+    assert rewritten.codes.tolist() == store.codes.tolist()
+    assert f'-v{population_store.STORE_VERSION}.' in os.path.basename(rewritten.directory)
+
+
+def test_service(synthetic_paths):
+    schools_path, population_path = synthetic_paths
+    index = service.load_index(schools_path, population_path)
+
+    code = int(index.age_codes[0])
+    gmina = index.gmina(gmina_codes.format_codes(code))
+    assert gmina == index.gmina(code)
+    assert gmina['code'] == gmina_codes.format_codes(code)
+    assert len(gmina['per_age']) == 17
+    with pytest.raises(KeyError):
+        index.gmina(1)
+
+    everything = index.aggregate()
+    assert everything['per_teacher']['rows'] == len(index.teacher_codes)
+    voivodeship = gmina['voivodeship']
+    filtered = index.aggregate(voivodeship=voivodeship.upper(), gmina_type=gmina['gmina_type'])
+    assert filtered is index.aggregate(voivodeship, gmina['gmina_type'])
+    assert 0 < filtered['per_age']['gminas'] < everything['per_age']['gminas']
+    assert index.aggregate(school_type='Nie ma takiej')['per_teacher'] == {'rows': 0}
+    # Results for values not in the data are not kept, whatever is queried
+    assert index.aggregate(school_type='Nie ma takiej') is not \
+        index.aggregate(school_type='Nie ma takiej')
+
+    server = service.make_server(index, 0)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        url = f'http://127.0.0.1:{server.server_address[1]}'
+        with urllib.request.urlopen(f'{url}/gmina/{gmina["code"]}') as response:
+            assert json.load(response)['per_teacher'] == gmina['per_teacher']
+        query = urllib.parse.urlencode({'voivodeship': voivodeship,
+                                        'gmina_type': gmina['gmina_type']})
+        with urllib.request.urlopen(f'{url}/aggregate?{query}') as response:
+            assert json.load(response)['per_age']['gminas'] == filtered['per_age']['gminas']
+        for path in ['gmina/1', 'gmina/abc', 'aggregate/1']:
+            with pytest.raises(urllib.error.HTTPError) as error:
+                urllib.request.urlopen(f'{url}/{path}')
+            assert error.value.code == 404
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f'{url}/aggregate?powiat=x')
+        assert error.value.code == 400
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+# Per row implementation from before normalize_schools, frozen as the reference
+TYPES_PER_ROW = {}
+for _type in ['Przedszkole', 'Punkt przedszkolny', 'Zespół wychowania przedszkolnego']:
+    TYPES_PER_ROW[_type] = 'Przedszkole'
+for _type in ['Szkoła podstawowa', 'Ogólnokształcąca szkoła muzyczna I stopnia']:
+    TYPES_PER_ROW[_type] = 'Szkoła podstawowa'
+for _type in ['Branżowa szkoła I stopnia', 'Szkoła specjalna przysposabiająca do pracy']:
+    TYPES_PER_ROW[_type] = 'Zawodówka'
+for _type in ['Czteroletnie liceum plastyczne', 'Ogólnokształcąca szkoła muzyczna II stopnia',
+              'Liceum ogólnokształcące']:
+    TYPES_PER_ROW[_type] = 'Liceum ogólnokształcące'
+for _type in ['Gimnazjum', 'Technikum', 'Sześcioletnia ogólnokształcąca szkoła sztuk pięknych',
+              'Dziewięcioletnia ogólnokształcąca szkoła baletowa']:
+    TYPES_PER_ROW[_type] = _type
+
+
+def normalize_per_row(schools: pd.DataFrame) -> (pd.DataFrame, int):
+    rows = schools.astype({'Nazwa typu': object, 'Typ gminy': object, 'Województwo': object})
+    types = rows['Nazwa typu'].map(TYPES_PER_ROW)
+    dropped = rows.loc[types.isna(), 'Uczniowie, wychow., słuchacze'].sum()
+    gmina_types = {'M': 1, 'Gm': 2, 'M-Gm': 3}
+    codes = [int(woj) * 100000 + int(pow_) * 1000 + int(gm) * 10 + gmina_types.get(kind, 0)
+             for woj, pow_, gm, kind in zip(rows['woj'], rows['pow'], rows['gm'],
+                                            rows['Typ gminy'])]
+    normalized = pd.DataFrame({'Nazwa typu': types,
+                               'Województwo': rows['Województwo'].str[5:].str.capitalize(),
+                               'Kod gminy': codes}, index=rows.index)
+    return normalized, dropped
+
+
+def test_normalize_schools():
+    schools = schema.apply_schema(synthetic.generate_schools(0.05).set_index('Lp.'))
+    schools.loc[schools.index[:3], 'Typ gminy'] = np.nan
+    expected, expected_dropped = normalize_per_row(schools)
+    assert expected_dropped > 0
+
+    original = schools.copy()
+    strings = schools.astype({'Nazwa typu': object, 'Typ gminy': object, 'Województwo': object})
+    # Categories and plain strings, which are factorized, give the same results
+    for frame in [schools, strings]:
+        normalized, dropped = sfa.normalize_schools(frame)
+        assert dropped == expected_dropped
+        assert list(normalized.columns) == sfa.PER_AGE_COLS + ['Kod gminy']
+        pd.testing.assert_frame_equal(
+            normalized[expected.columns].astype({'Nazwa typu': object, 'Województwo': object,
+                                                 'Kod gminy': np.int64}), expected)
+        # Other columns are passed through unchanged
+        pd.testing.assert_frame_equal(normalized[['woj', 'pow', 'gm', 'Typ gminy']],
+                                      frame[['woj', 'pow', 'gm', 'Typ gminy']])
+    # The input is left as it was
+    pd.testing.assert_frame_equal(schools, original)
+
+
+@pytest.mark.parametrize('copy_on_write', [False, True])
+def test_stages_leave_inputs(synthetic_paths, copy_on_write):
+    schools_path, _ = synthetic_paths
+    if 'copy_on_write' not in dir(pd.options.mode):
+        pytest.skip('pandas has no copy-on-write mode')
+
+    with pd.option_context('mode.copy_on_write', copy_on_write), warnings.catch_warnings():
+        warnings.simplefilter('error', pd.errors.SettingWithCopyWarning)
+        loaded, _ = parsing.stream_schools_df(schools_path)
+        original = loaded.copy()
+        schools, _ = per_teacher_analysis.prepare_schools(schools_path)
+        prepared = schools.copy()
+        per_age_input, _ = per_age_analysis.prepare_per_age_input(schools)
+
+        for stage in [parsing.sum_teachers, parsing.drop_schools_without_students]:
+            stage(loaded)
+        pd.testing.assert_frame_equal(loaded, original)
+        pd.testing.assert_frame_equal(schools, prepared)
+
+    expected, _ = per_age_analysis.prepare_per_age_input(prepared)
+    pd.testing.assert_frame_equal(per_age_input, expected)